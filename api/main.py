@@ -1,10 +1,21 @@
 # can only predict with existing users.
 
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from collections import OrderedDict
+from typing import List, Optional
+from contextlib import contextmanager
+import base64
+import contextvars
+import hashlib
+import json
 import pickle
+import threading
+import time
+import uuid
 import numpy as np
 from lightfm import LightFM
-from scipy.sparse import csr_matrix
+from scipy.sparse import csr_matrix, load_npz
 import os
 
 # load model & dataset
@@ -14,13 +25,18 @@ MODEL_PATH = os.path.join(BASE_DIR, "lightfm_msd_model.pkl")
 with open(MODEL_PATH, "rb") as f:
     model, _ = pickle.load(f)
 
+# identifies the loaded artifacts in cursors and cache keys; changes whenever the model file does
+_model_stat = os.stat(MODEL_PATH)
+MODEL_VERSION = os.environ.get("MODEL_VERSION") or hashlib.sha1(
+    f"{_model_stat.st_size}:{_model_stat.st_mtime_ns}".encode()).hexdigest()[:12]
+
 DATASET_PATH = os.path.join(BASE_DIR, "lightfm_dataset.pkl")
 with open(DATASET_PATH, "rb") as f:
     data = pickle.load(f)
 
 dataset = data['dataset']
-num_users = data['num_users']
-num_items = data['num_items']
+# older dataset pickles stored these counts swapped, so take them from the dataset itself
+num_users, num_items = dataset.interactions_shape()
 
 print(f"Loaded dataset with {num_users} users, {num_items} items")
 
@@ -28,39 +44,467 @@ user_mapping = dataset.mapping()[0]  # user_id -> internal_id
 item_mapping = dataset.mapping()[2]  # item_id -> internal_id
 internal_to_item = {v: k for k, v in item_mapping.items()} # internal_id -> item_id
 
+# internal_id -> external id as arrays, for fancy-indexing whole blocks at once
+user_ids = np.empty(num_users, dtype=object)
+for name, idx in user_mapping.items():
+    user_ids[idx] = name
+item_ids = np.array([internal_to_item[i] for i in range(num_items)], dtype=object)
+
+# precompute representations once instead of on every predict call
+ITEM_FEATURES_PATH = os.path.join(BASE_DIR, "lightfm_item_features.npz")
+if os.path.exists(ITEM_FEATURES_PATH):
+    item_features = load_npz(ITEM_FEATURES_PATH).tocsr()
+    item_biases, item_embeddings = model.get_item_representations(item_features)
+else:
+    # models trained before the feature matrix was exported: identity features only
+    item_biases = model.item_biases[:num_items]
+    item_embeddings = model.item_embeddings[:num_items]
+user_biases, user_embeddings = model.get_user_representations()
+
+item_biases = np.ascontiguousarray(item_biases, dtype=np.float32)
+item_embeddings = np.ascontiguousarray(item_embeddings, dtype=np.float32)
+user_biases = np.ascontiguousarray(user_biases, dtype=np.float32)
+user_embeddings = np.ascontiguousarray(user_embeddings, dtype=np.float32)
+
+# every artist's own tracks from training; masked out of its rankings unless include_known
+INTERACTIONS_PATH = os.path.join(BASE_DIR, "lightfm_interactions.npz")
+known = None
+if os.path.exists(INTERACTIONS_PATH):
+    known = load_npz(INTERACTIONS_PATH).tocsr()
+    if known.shape != (num_users, num_items):
+        print(f"Ignoring interactions of shape {known.shape} (model has {num_users} x {num_items})")
+        known = None
+
+# precomputed "more like this" lists (see ml_training/neighbors.py), memory-mapped
+# so pages are only read when asked for and shared between worker processes
+NEIGHBORS_PATH = os.path.join(BASE_DIR, "lightfm_item_neighbors.npy")
+NEIGHBOR_SCORES_PATH = os.path.join(BASE_DIR, "lightfm_item_neighbor_scores.npy")
+neighbor_indices = neighbor_scores = None
+if os.path.exists(NEIGHBORS_PATH) and os.path.exists(NEIGHBOR_SCORES_PATH):
+    neighbor_indices = np.load(NEIGHBORS_PATH, mmap_mode="r")
+    neighbor_scores = np.load(NEIGHBOR_SCORES_PATH, mmap_mode="r")
+    if neighbor_indices.shape[0] != num_items:
+        print(f"Ignoring neighbour table for {neighbor_indices.shape[0]} items (model has {num_items})")
+        neighbor_indices = neighbor_scores = None
+
+# audio-feature KD-tree (see ml_training/content_index.py) for artists the model has never seen
+CONTENT_INDEX_PATH = os.path.join(BASE_DIR, "lightfm_content_index.pkl")
+content_index = None
+if os.path.exists(CONTENT_INDEX_PATH):
+    with open(CONTENT_INDEX_PATH, "rb") as f:
+        content_index = pickle.load(f)
+    if content_index["tree"].n != num_items:
+        print(f"Ignoring content index for {content_index['tree'].n} items (model has {num_items})")
+        content_index = None
+
+# users scored per matrix product in /export/recommendations
+EXPORT_BLOCK_SIZE = 1024
+
+# /predict pagination: the top RANKED_DEPTH ids per (model version, user, options)
+# are cached so later pages are slices; deeper pages fall back to a partial selection
+RANKED_DEPTH = 500
+RANKED_CACHE_SIZE = 2048
+MAX_PAGE_SIZE = 100
+
+# /predict attribute filters: bucket bitmaps over the content index's raw audio features
+FILTER_BUCKETS = 64
+CONTINUOUS_FILTERS = ("tempo", "loudness", "duration")
+CATEGORICAL_FILTERS = ("key", "mode", "time_signature")
+
+# request tracing: stage timings go back as Server-Timing and, when
+# TRACE_LOG_FILE is set, one NDJSON line per request (same format as the Node
+# server's, see server/utils/traceReport.js)
+TRACE_LOG_FILE = os.environ.get("TRACE_LOG_FILE")
+trace_log = open(TRACE_LOG_FILE, "a", buffering=1) if TRACE_LOG_FILE else None
+trace_log_lock = threading.Lock()
+request_spans = contextvars.ContextVar("request_spans", default=None)
+
+print(f"Precomputed representations for {item_embeddings.shape[0]} items")
+
+
+@contextmanager
+def span(name):
+    """Add the time spent in the block to this request's `name` stage."""
+    spans = request_spans.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if spans is not None:
+            spans[name] = spans.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+
+def score_user(internal_user_id):
+    """Scores of every item for one user, same as model.predict over all items."""
+    return item_embeddings @ user_embeddings[internal_user_id] + item_biases + user_biases[internal_user_id]
+
+
+def top_k(scores, k):
+    """Indices of the k highest (finite) scores, best first."""
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return top[np.isfinite(scores[top])]
+
+
+def mask_known_user(scores, internal_user_id):
+    """Set the user's training items to -inf, in place."""
+    if known is not None:
+        lo, hi = known.indptr[internal_user_id], known.indptr[internal_user_id + 1]
+        scores[known.indices[lo:hi]] = -np.inf
+
+
+def mask_known_block(scores, start, stop):
+    """mask_known_user for users [start, stop) of a score block, in one scatter."""
+    if known is not None:
+        rows = np.repeat(np.arange(stop - start), np.diff(known.indptr[start:stop + 1]))
+        scores[rows, known.indices[known.indptr[start]:known.indptr[stop]]] = -np.inf
+
+
+def score_block(start, stop):
+    """[stop - start, num_items] scores for a contiguous block of users, one GEMM."""
+    scores = user_embeddings[start:stop] @ item_embeddings.T
+    scores += item_biases
+    scores += user_biases[start:stop, None]
+    return scores
+
+
+def top_k_rows(scores, k):
+    """Row-wise top_k for a score block."""
+    k = min(k, scores.shape[1])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+def content_neighbors(seed_rows, k, allowed=None):
+    """
+    Internal ids of the k tracks nearest the seeds' mean audio profile, seeds
+    (and items outside the allowed mask) excluded.
+    """
+    seed_rows = np.unique(seed_rows)
+    profile = ((content_index["vectors"][seed_rows] - content_index["mean"]) / content_index["std"]).mean(axis=0)
+    n_query = k + len(seed_rows)
+    while True:
+        n_query = min(n_query, num_items)
+        _, found = content_index["tree"].query(profile, k=n_query)
+        found = np.atleast_1d(found)
+        keep = ~np.isin(found, seed_rows)
+        if allowed is not None:
+            keep &= allowed[found]
+        # widen the search until enough neighbours pass the filters
+        if keep.sum() >= k or n_query == num_items:
+            return found[keep][:k]
+        n_query *= 4
+
+
+def pack_rows(rows):
+    """np.packbits bitmap over all items with the given rows set."""
+    bits = np.zeros(num_items, dtype=bool)
+    bits[rows] = True
+    return np.packbits(bits)
+
+
+def build_filter_index(vectors, columns):
+    """
+    Continuous attributes: items sorted by value, cut into FILTER_BUCKETS
+    equal-count buckets, one packed bitmap per bucket. Categorical
+    attributes: one packed bitmap per level.
+    """
+    columns = list(columns)
+    index = {}
+    for name in CONTINUOUS_FILTERS:
+        values = vectors[:, columns.index(name)]
+        order = np.argsort(values, kind="stable")
+        bounds = np.linspace(0, num_items, FILTER_BUCKETS + 1).astype(np.int64)
+        index[name] = {
+            "order": order,
+            "sorted": values[order],
+            "bounds": bounds,
+            "bitmaps": np.stack([pack_rows(order[lo:hi]) for lo, hi in zip(bounds[:-1], bounds[1:])]),
+        }
+    for name in CATEGORICAL_FILTERS:
+        values = vectors[:, columns.index(name)].astype(np.int64)
+        levels = np.unique(values)
+        index[name] = {"levels": levels, "bitmaps": np.stack([np.packbits(values == level) for level in levels])}
+    return index
+
+
+def range_bitmap(name, lo, hi):
+    """Packed bitmap of items with lo <= value <= hi (either bound may be None)."""
+    entry = filter_index[name]
+    p = np.searchsorted(entry["sorted"], lo, "left") if lo is not None else 0
+    q = np.searchsorted(entry["sorted"], hi, "right") if hi is not None else num_items
+    bounds = entry["bounds"]
+    # buckets lying wholly inside [p, q) are OR-ed in; the partial ones at
+    # either end contribute their in-range items bit by bit
+    first = np.searchsorted(bounds, p, "left")
+    last = np.searchsorted(bounds, q, "right") - 1
+    packed = np.zeros(entry["bitmaps"].shape[1], dtype=np.uint8)
+    if first < last:
+        packed |= np.bitwise_or.reduce(entry["bitmaps"][first:last], axis=0)
+        edges = np.concatenate([entry["order"][p:bounds[first]], entry["order"][bounds[last]:q]])
+    else:
+        edges = entry["order"][p:q]
+    np.bitwise_or.at(packed, edges >> 3, (128 >> (edges & 7)).astype(np.uint8))
+    return packed
+
 
+def levels_bitmap(name, allowed):
+    """Packed bitmap of items whose value is one of allowed."""
+    entry = filter_index[name]
+    selected = np.isin(entry["levels"], allowed)
+    if not selected.any():
+        return np.zeros(entry["bitmaps"].shape[1], dtype=np.uint8)
+    return np.bitwise_or.reduce(entry["bitmaps"][selected], axis=0)
+
+
+def filter_mask(filters):
+    """Boolean [num_items] mask of items passing every filter (AND of the bitmaps), or None."""
+    bitmaps = [range_bitmap(name, *filters[name]) for name in CONTINUOUS_FILTERS if name in filters]
+    bitmaps += [levels_bitmap(name, filters[name]) for name in CATEGORICAL_FILTERS if name in filters]
+    if not bitmaps:
+        return None
+    return np.unpackbits(np.bitwise_and.reduce(bitmaps), count=num_items).astype(bool)
+
+
+# built once at startup; track_filters rejects filters when it is missing
+filter_index = None
+if content_index is not None:
+    filter_index = build_filter_index(content_index["vectors"], content_index["columns"])
+
+
+class RankedCache:
+    """Bounded LRU of ranked id arrays; shared by the endpoint's worker threads."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            ranked = self.entries.get(key)
+            if ranked is not None:
+                self.entries.move_to_end(key)
+            return ranked
+
+    def put(self, key, ranked):
+        with self.lock:
+            self.entries[key] = ranked
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+ranked_cache = RankedCache(RANKED_CACHE_SIZE)
+
+
+def ranked_items(internal_user_id, include_known, filters, depth):
+    """The user's top `depth` internal ids after masking, best first."""
+    with span("score"):
+        scores = score_user(internal_user_id)
+    with span("mask"):
+        if not include_known:
+            mask_known_user(scores, internal_user_id)
+    with span("filter"):
+        allowed = filter_mask(filters)
+        if allowed is not None:
+            scores[~allowed] = -np.inf
+    with span("topk"):
+        return top_k(scores, depth)
+
+
+def query_key(user_id, include_known, filters):
+    return (MODEL_VERSION, user_id, include_known,
+            tuple(sorted((name, tuple(value)) for name, value in filters.items())))
+
+
+def encode_cursor(key, offset):
+    query = hashlib.sha1(repr(key).encode()).hexdigest()[:12]
+    payload = json.dumps({"v": MODEL_VERSION, "q": query, "o": offset}).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor, key):
+    """Offset stored in a cursor issued for the same query and model version."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        version, query, offset = payload["v"], payload["q"], int(payload["o"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if version != MODEL_VERSION:
+        raise HTTPException(status_code=400, detail="Cursor is from another model version; start again without it")
+    if query != hashlib.sha1(repr(key).encode()).hexdigest()[:12] or offset < 0:
+        raise HTTPException(status_code=400, detail="Cursor does not match this query")
+    return offset
+
+
+def export_lines(k, include_known=False):
+    """NDJSON chunks, one per user block, in user-id order."""
+    for start in range(0, num_users, EXPORT_BLOCK_SIZE):
+        stop = min(start + EXPORT_BLOCK_SIZE, num_users)
+        scores = score_block(start, stop)
+        if not include_known:
+            mask_known_block(scores, start, stop)
+        top = top_k_rows(scores, k)
+        finite = np.isfinite(np.take_along_axis(scores, top, axis=1))
+        yield "".join(
+            json.dumps({"user_id": user, "top_items": items[keep].tolist()}) + "\n"
+            for user, items, keep in zip(user_ids[start:stop], item_ids[top], finite)
+        )
+
+
+def track_filters(
+    tempo_min: Optional[float] = None, tempo_max: Optional[float] = None,
+    loudness_min: Optional[float] = None, loudness_max: Optional[float] = None,
+    duration_min: Optional[float] = None, duration_max: Optional[float] = None,
+    key: Optional[List[int]] = Query(None), mode: Optional[List[int]] = Query(None),
+    time_signature: Optional[List[int]] = Query(None),
+):
+    """Attribute filters given on the query string, e.g. ?tempo_min=110&tempo_max=130&mode=1."""
+    ranges = {"tempo": (tempo_min, tempo_max), "loudness": (loudness_min, loudness_max),
+              "duration": (duration_min, duration_max)}
+    filters = {name: bounds for name, bounds in ranges.items() if bounds != (None, None)}
+    levels = {"key": key, "mode": mode, "time_signature": time_signature}
+    filters.update({name: values for name, values in levels.items() if values})
+    if filters and filter_index is None:
+        raise HTTPException(status_code=503, detail="No content index loaded; attribute filters are unavailable")
+    return filters
+
+
+# the artist list only changes with the model, so its body and ETag are built once
+ARTISTS_BODY = json.dumps({"artists": sorted(user_mapping.keys())}).encode()
+ARTISTS_ETAG = f'"{hashlib.sha1(ARTISTS_BODY).hexdigest()}"'
 
 # Fast API
 app = FastAPI(title="Spotify LightFM Recommender")
 
+@app.middleware("http")
+async def trace_request(request: Request, call_next):
+    # X-Request-Id comes from the Node server so both sides' traces join up
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    spans = {}
+    token = request_spans.set(spans)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        request_spans.reset(token)
+    total = (time.perf_counter() - start) * 1000
+
+    # X-Model-Version lets clients notice a redeployed model from any response
+    response.headers["X-Model-Version"] = MODEL_VERSION
+    response.headers["X-Request-Id"] = request_id
+    response.headers["Server-Timing"] = ", ".join(
+        [f"{name};dur={ms:.2f}" for name, ms in spans.items()] + [f"total;dur={total:.2f}"])
+    if trace_log is not None:
+        # logged once the body has been sent: a streamed export is still
+        # running when the headers (and Server-Timing) go out
+        route = request.scope.get("route")
+        body = response.body_iterator
+
+        async def logged_body():
+            try:
+                async for chunk in body:
+                    yield chunk
+            finally:
+                line = json.dumps({
+                    "ts": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "service": "ml",
+                    "requestId": request_id, "method": request.method,
+                    "path": route.path if route else request.url.path, "status": response.status_code,
+                    "durationMs": round((time.perf_counter() - start) * 1000, 3),
+                    "spans": {name: round(ms, 3) for name, ms in spans.items()},
+                })
+                with trace_log_lock:
+                    trace_log.write(line + "\n")
+
+        response.body_iterator = logged_body()
+    return response
+
 @app.get('/artists')
-def artists():
+def artists(request: Request):
     """
     Returns all artists we can make recommendations for
+    (304 when If-None-Match carries the current ETag)
     """
-    artist_list = sorted(user_mapping.keys())
-    return {"artists": artist_list}
+    headers = {"ETag": ARTISTS_ETAG, "Cache-Control": "no-cache"}
+    if ARTISTS_ETAG in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(ARTISTS_BODY, media_type="application/json", headers=headers)
+
+@app.get("/health")
+def health():
+    return {"status": "ok", "model_version": MODEL_VERSION, "users": num_users, "items": num_items}
 
 @app.get("/predict")
-def predict(user_id: str):
+def predict(user_id: str, seed_track_ids: Optional[List[str]] = Query(None), include_known: bool = False,
+            filters: dict = Depends(track_filters), limit: int = Query(5, ge=1, le=MAX_PAGE_SIZE),
+            cursor: Optional[str] = None):
     """
-    Predict top 5 tracks for an existing user.
+    Predict the top `limit` tracks for an existing user, leaving out the
+    user's own training tracks unless include_known and any track failing
+    the attribute filters. Pass back next_cursor (with the same parameters)
+    for the following page. Unknown users get the tracks closest to the audio
+    profile of seed_track_ids instead (cold_start=True, single page).
     """
 
     if user_id not in user_mapping:
-        raise HTTPException(status_code=404, detail=f"User '{user_id}' not in training dataset")
+        seed_rows = [item_mapping[t] for t in seed_track_ids or [] if t in item_mapping]
+        if content_index is None or not seed_rows:
+            raise HTTPException(status_code=404, detail=f"User '{user_id}' not in training dataset")
+        with span("content"):
+            rows = content_neighbors(seed_rows, limit, filter_mask(filters))
+        return {
+            "user_id": user_id,
+            "top_items": item_ids[rows].tolist(),
+            "cold_start": True,
+            "next_cursor": None
+        }
 
     internal_user_id = user_mapping[user_id]
+    key = query_key(user_id, include_known, filters)
+    offset = decode_cursor(cursor, key) if cursor else 0
+    stop = offset + limit
 
-    scores = model.predict(
-        user_ids=internal_user_id,
-        item_ids=np.arange(num_items),
-    )
-    top_indices = np.argsort(-scores)[:5]
-    top_item_ids = [internal_to_item[i] for i in top_indices]
+    ranked = ranked_cache.get(key)
+    if ranked is None:
+        ranked = ranked_items(internal_user_id, include_known, filters, RANKED_DEPTH)
+        ranked_cache.put(key, ranked)
+    if stop > len(ranked) == RANKED_DEPTH:
+        # past the cached depth: select only as deep as this page needs
+        ranked = ranked_items(internal_user_id, include_known, filters, stop)
+    # a list shorter than asked for holds every remaining track
+    complete = len(ranked) < max(stop, RANKED_DEPTH)
 
     return {
         "user_id": user_id,
-        "top_items": top_item_ids,
-        "cold_start": False
-    }
\ No newline at end of file
+        "top_items": item_ids[ranked[offset:stop]].tolist(),
+        "cold_start": False,
+        "next_cursor": None if complete and stop >= len(ranked) else encode_cursor(key, stop)
+    }
+
+@app.get("/similar")
+def similar(track_id: str, k: int = Query(5, ge=1)):
+    """
+    Tracks most similar to track_id (cosine over item embeddings), best first.
+    """
+    if neighbor_indices is None:
+        raise HTTPException(status_code=503, detail="No neighbour table loaded; retrain to build it")
+    if track_id not in item_mapping:
+        raise HTTPException(status_code=404, detail=f"Track '{track_id}' not in training dataset")
+
+    row = item_mapping[track_id]
+    k = min(k, neighbor_indices.shape[1])
+    return {
+        "track_id": track_id,
+        "similar_items": item_ids[neighbor_indices[row, :k]].tolist(),
+        "scores": neighbor_scores[row, :k].tolist(),
+    }
+
+@app.get("/export/recommendations")
+def export_recommendations(k: int = Query(5, ge=1), include_known: bool = False):
+    """
+    Streams top-k tracks for every user as NDJSON, in user-id order.
+    """
+    return StreamingResponse(export_lines(k, include_known), media_type="application/x-ndjson")
@@ -0,0 +1,193 @@
+"""
+Offline bulk scoring: every artist's top-k tracks in one job.
+
+User and item representations are computed once and memory-mapped by a pool
+of worker processes; each worker scores a contiguous block of users with one
+matrix product, masks the artist's own training tracks (as /predict does)
+and keeps the top k per row with argpartition. Blocks come
+back in user-id order and are streamed to NDJSON (one artist per line, the
+shape of the server's ArtistRecommendation documents) or Parquet.
+
+    python bulk_score.py --artifacts-dir /api --output /api/artist_recs.ndjson --k 5
+    node ../server/utils/loadArtistRecommendations.js /api/artist_recs.ndjson
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import scipy.sparse as sp
+
+import evaluation
+import sweep
+import training
+
+DEFAULT_K = 5
+BLOCK_SIZE = 2048
+
+# set in each worker by _init_worker
+_reprs = None
+_known = None
+
+
+def load_representations(artifacts_dir):
+    """(user ids, item ids, reprs, known interactions or None) for the artifacts api/main.py serves."""
+    with open(os.path.join(artifacts_dir, training.MODEL_FILE), "rb") as f:
+        model, dataset = pickle.load(f)
+    user_mapping, _, item_mapping, _ = dataset.mapping()
+    num_items = len(item_mapping)
+
+    features_path = os.path.join(artifacts_dir, training.ITEM_FEATURES_FILE)
+    if os.path.exists(features_path):
+        reprs = evaluation.representations(model, item_features=sp.load_npz(features_path))
+    else:
+        # identity-only models, same fallback as the API
+        user_biases, user_embeddings, item_biases, item_embeddings = evaluation.representations(model)
+        reprs = (user_biases, user_embeddings, item_biases[:num_items], item_embeddings[:num_items])
+
+    user_ids = np.empty(len(user_mapping), dtype=object)
+    for name, idx in user_mapping.items():
+        user_ids[idx] = name
+    item_ids = np.empty(num_items, dtype=object)
+    for name, idx in item_mapping.items():
+        item_ids[idx] = name
+
+    interactions_path = os.path.join(artifacts_dir, training.INTERACTIONS_FILE)
+    known = sp.load_npz(interactions_path).tocsr() if os.path.exists(interactions_path) else None
+    return user_ids, item_ids, reprs, known
+
+
+def model_version(artifacts_dir):
+    """The X-Model-Version api/main.py reports for these artifacts."""
+    st = os.stat(os.path.join(artifacts_dir, training.MODEL_FILE))
+    return os.environ.get("MODEL_VERSION") or hashlib.sha1(f"{st.st_size}:{st.st_mtime_ns}".encode()).hexdigest()[:12]
+
+
+def _init_worker(directory, has_known):
+    global _reprs, _known
+    _reprs = tuple(np.load(os.path.join(directory, f"{i}.npy"), mmap_mode="r") for i in range(4))
+    _known = sweep.load_shared(directory, "known") if has_known else None
+
+
+def score_block(start, stop, k):
+    """Top-k item indices and scores for users [start, stop), best first; masked items score -inf."""
+    scores = evaluation.score_users(_reprs, np.arange(start, stop))
+    if _known is not None:
+        evaluation.mask_known(scores, _known, start, stop)
+    k = min(k, scores.shape[1])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    return (np.take_along_axis(top, order, axis=1).astype(np.int32),
+            np.take_along_axis(top_scores, order, axis=1).astype(np.float32))
+
+
+class NdjsonWriter:
+    def __init__(self, path, version):
+        self.f = open(path, "w")
+        self.version = version
+
+    def write(self, artists, recommendations, scores):
+        for artist, recs, row_scores in zip(artists, recommendations, scores):
+            keep = np.isfinite(row_scores)
+            self.f.write(json.dumps({
+                "artistId": artist,
+                "artistName": artist,
+                "recommendations": list(recs[keep]),
+                "scores": [round(float(s), 5) for s in row_scores[keep]],
+                "modelVersion": self.version,
+            }) + "\n")
+
+    def close(self):
+        self.f.close()
+
+
+class ParquetWriter:
+    def __init__(self, path, version):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise SystemExit("Parquet output needs pyarrow (pip install pyarrow); use .ndjson instead") from e
+        self.pa = pa
+        self.version = version
+        self.schema = pa.schema([
+            ("artistId", pa.string()),
+            ("artistName", pa.string()),
+            ("recommendations", pa.list_(pa.string())),
+            ("scores", pa.list_(pa.float32())),
+            ("modelVersion", pa.string()),
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, artists, recommendations, scores):
+        self.writer.write_table(self.pa.table({
+            "artistId": list(artists),
+            "artistName": list(artists),
+            "recommendations": [list(r[np.isfinite(s)]) for r, s in zip(recommendations, scores)],
+            "scores": [list(s[np.isfinite(s)]) for s in scores],
+            "modelVersion": [self.version] * len(artists),
+        }, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def bulk_score(artifacts_dir, output_path, k=DEFAULT_K, block_size=BLOCK_SIZE, workers=None,
+               include_known=False):
+    user_ids, item_ids, reprs, known = load_representations(artifacts_dir)
+    if include_known:
+        known = None
+    n_users = len(user_ids)
+    version = model_version(artifacts_dir)
+    writer_class = ParquetWriter if output_path.endswith(".parquet") else NdjsonWriter
+    writer = writer_class(output_path, version)
+
+    shared_dir = tempfile.mkdtemp(prefix="lightfm_bulk_")
+    start = time.perf_counter()
+    try:
+        for i, array in enumerate(reprs):
+            np.save(os.path.join(shared_dir, f"{i}.npy"), array)
+        if known is not None:
+            sweep.save_shared({"known": known}, shared_dir)
+
+        blocks = [(lo, min(lo + block_size, n_users)) for lo in range(0, n_users, block_size)]
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                                 initializer=_init_worker, initargs=(shared_dir, known is not None)) as pool:
+            # map() yields in submission order, so the output stays in user-id order
+            results = pool.map(score_block, *zip(*blocks), [k] * len(blocks))
+            for (lo, hi), (top, top_scores) in zip(blocks, results):
+                writer.write(user_ids[lo:hi], item_ids[top], top_scores)
+    finally:
+        writer.close()
+        shutil.rmtree(shared_dir, ignore_errors=True)
+
+    elapsed = time.perf_counter() - start
+    print(f"scored {n_users} artists x {len(item_ids)} tracks in {elapsed:.2f}s "
+          f"({n_users / max(elapsed, 1e-9):.0f} artists/s) -> {output_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export every artist's top-k tracks")
+    parser.add_argument("--artifacts-dir", default=training.OUTPUT_DIR)
+    parser.add_argument("--output", default=os.path.join(training.OUTPUT_DIR, "artist_recommendations.ndjson"),
+                        help=".ndjson or .parquet")
+    parser.add_argument("--k", type=int, default=DEFAULT_K)
+    parser.add_argument("--block-size", type=int, default=BLOCK_SIZE, help="users per GEMM block")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--include-known", action="store_true",
+                        help="keep each artist's own training tracks in its list")
+    args = parser.parse_args()
+    bulk_score(args.artifacts_dir, args.output, k=args.k, block_size=args.block_size, workers=args.workers,
+               include_known=args.include_known)
+
+
+if __name__ == "__main__":
+    main()
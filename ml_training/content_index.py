@@ -0,0 +1,51 @@
+"""
+Content-based fallback index over the tracks' audio features.
+
+Each track's tempo / loudness / duration / key / mode / time_signature are
+standardised with the training catalogue's mean and std and put in a KD-tree,
+rows in the Dataset's internal item order. api/main.py queries it with the
+mean profile of some seed tracks when an artist is not in the model, so it
+can still answer with real tracks in O(log n) per query.
+"""
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+import features
+
+
+def track_vectors(dataset, df_tracks):
+    """(internal item ids, raw [n, 6] float32 audio vectors) for the tracks in df_tracks."""
+    item_mapping = dataset.mapping()[2]
+    df = df_tracks.drop_duplicates("track_id")
+    rows = df["track_id"].map(item_mapping).to_numpy()
+    return rows, df[list(features.AUDIO_FEATURES)].to_numpy(dtype=np.float32)
+
+
+def build_content_index(dataset, df_tracks):
+    """{"columns", "vectors" (raw, internal item order), "mean", "std", "tree"}."""
+    n_items = dataset.interactions_shape()[1]
+    rows, values = track_vectors(dataset, df_tracks)
+    vectors = np.zeros((n_items, len(features.AUDIO_FEATURES)), dtype=np.float32)
+    vectors[rows] = values
+
+    mean = vectors.mean(axis=0)
+    std = vectors.std(axis=0)
+    std[std == 0] = 1.0
+    return _with_tree({"columns": features.AUDIO_FEATURES, "vectors": vectors, "mean": mean, "std": std})
+
+
+def extend_content_index(index, dataset, df_new):
+    """Append rows for items added to the Dataset since the index was built; mean/std stay fixed."""
+    n_items = dataset.interactions_shape()[1]
+    vectors = np.zeros((n_items, index["vectors"].shape[1]), dtype=np.float32)
+    vectors[:len(index["vectors"])] = index["vectors"]
+    rows, values = track_vectors(dataset, df_new)
+    vectors[rows] = values
+    return _with_tree({**index, "vectors": vectors})
+
+
+def _with_tree(index):
+    standardized = (index["vectors"] - index["mean"]) / index["std"]
+    return {**index, "tree": cKDTree(standardized)}
+
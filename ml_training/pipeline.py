@@ -0,0 +1,129 @@
+"""
+Minimal staged pipeline with a content-addressed stage cache.
+
+Each stage's output is pickled under <cache_dir>/<stage>/<key>.pkl, where the
+key hashes the stage name, its config and the keys of the stages it depends
+on. Changing one hyperparameter therefore only invalidates the stage that
+reads it and everything downstream; earlier stages load from the cache.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import time
+from collections import namedtuple
+from contextlib import nullcontext
+
+import profiling
+
+# func(config, *dependency_outputs) -> output; cache=False for side-effect-only stages
+Stage = namedtuple("Stage", ["name", "func", "deps", "config", "cache"], defaults=(True,))
+
+
+def stage_key(stage, dep_keys):
+    payload = json.dumps(
+        {"stage": stage.name, "config": stage.config, "deps": dep_keys},
+        sort_keys=True, default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def fingerprint_files(path, suffix=""):
+    """Hash of the relative path, size and mtime of every file under path (or of path itself)."""
+    digest = hashlib.sha256()
+    if os.path.isfile(path):
+        st = os.stat(path)
+        digest.update(f"{os.path.basename(path)}:{st.st_size}:{st.st_mtime_ns}\n".encode())
+        return digest.hexdigest()[:16]
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if not name.endswith(suffix):
+                continue
+            full = os.path.join(root, name)
+            st = os.stat(full)
+            digest.update(f"{os.path.relpath(full, path)}:{st.st_size}:{st.st_mtime_ns}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+class StageCache:
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, name, key):
+        return os.path.join(self.root, name, f"{key}.pkl")
+
+    def load(self, name, key):
+        path = self.path(name, key)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    def save(self, name, key, value):
+        path = self.path(name, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write-then-rename so an interrupted run never leaves a truncated entry
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+
+def dependents(stages, names):
+    """names plus every stage that (transitively) depends on one of them."""
+    closed = set(names)
+    for stage in stages:  # stages are in topological order
+        if closed.intersection(stage.deps):
+            closed.add(stage.name)
+    return closed
+
+
+def run(stages, cache=None, until=None, force=(), report=None):
+    """
+    Run stages in order up to and including `until`, reusing cached outputs.
+
+    Stages named in `force` (and everything downstream of them) are recomputed
+    and their cache entries overwritten. With a profiling.RunReport, every
+    stage (cached or not) is measured and its output sizes recorded.
+    Returns {stage name: output}.
+    """
+    names = [s.name for s in stages]
+    unknown = set(force) - set(names) - {"all"}
+    if unknown or (until is not None and until not in names):
+        raise ValueError(f"unknown stage(s): {sorted(unknown) or until}; expected one of {names}")
+    forced = set(names) if "all" in force else dependents(stages, force)
+    last = names.index(until) if until is not None else len(stages) - 1
+
+    outputs, keys = {}, {}
+    for stage in stages[:last + 1]:
+        keys[stage.name] = stage_key(stage, [keys[d] for d in stage.deps])
+        measure = report.stage(stage.name) if report is not None else nullcontext({})
+        with measure as record:
+            outputs[stage.name], record["cached"] = _run_stage(
+                stage, keys[stage.name], outputs, cache, stage.name in forced
+            )
+            record["key"] = keys[stage.name]
+        if report is not None:
+            record["outputs"] = profiling.describe(outputs[stage.name])
+
+    return outputs
+
+
+def _run_stage(stage, key, outputs, cache, forced):
+    """Returns (output, served_from_cache)."""
+    use_cache = cache is not None and stage.cache
+    if use_cache and not forced:
+        cached = cache.load(stage.name, key)
+        if cached is not None:
+            print(f"[{stage.name}] cached ({key})")
+            return cached, True
+
+    print(f"[{stage.name}] running ({key})")
+    start = time.perf_counter()
+    output = stage.func(stage.config, *(outputs[d] for d in stage.deps))
+    print(f"[{stage.name}] done in {time.perf_counter() - start:.2f}s")
+    if use_cache:
+        cache.save(stage.name, key, output)
+    return output, False
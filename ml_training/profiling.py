@@ -0,0 +1,144 @@
+"""
+Per-stage time and memory instrumentation for training runs.
+
+RunReport.stage() wraps a block and records wall time, CPU time, peak RSS
+(sampled from /proc while the stage runs) and, when tracemalloc is enabled,
+the peak traced allocation size and the source lines that allocated the most
+memory during the stage. The whole report is written out as JSON.
+"""
+
+import json
+import os
+import pickle
+import platform
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+RSS_SAMPLE_SECONDS = 0.05
+
+
+def current_rss():
+    """Resident set size in bytes, or None where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def max_rss():
+    """Process-lifetime RSS high-water mark in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class _RssSampler(threading.Thread):
+    """Polls RSS in the background to find a stage's own peak."""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.peak = current_rss() or 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(RSS_SAMPLE_SECONDS):
+            self.peak = max(self.peak, current_rss() or 0)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.peak = max(self.peak, current_rss() or 0)
+        return self.peak
+
+
+def describe(value):
+    """Sizes worth reporting for a stage output (matrices, frames, models)."""
+    if isinstance(value, dict):
+        described = {k: describe(v) for k, v in value.items()}
+        return {k: v for k, v in described.items() if v is not None}
+    if sp.issparse(value):
+        return {"shape": list(value.shape), "nnz": int(value.nnz)}
+    if isinstance(value, pd.DataFrame):
+        return {"rows": len(value), "columns": len(value.columns),
+                "bytes": int(value.memory_usage(deep=True).sum())}
+    if isinstance(value, np.ndarray):
+        return {"shape": list(value.shape), "bytes": int(value.nbytes)}
+    if type(value).__name__ == "LightFM":
+        return {"model_bytes": len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)),
+                "no_components": value.no_components}
+    return None
+
+
+class RunReport:
+    def __init__(self, trace_allocations=True, top_n=10):
+        self.trace_allocations = trace_allocations
+        self.top_n = top_n
+        self.stages = []
+        self.summary = {}
+        self.started = time.perf_counter()
+        self.meta = {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "argv": sys.argv,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        }
+        if trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name):
+        """Measure the wrapped block; yields a dict the caller can add fields to."""
+        record = {"stage": name}
+        sampler = _RssSampler()
+        rss_start = sampler.peak
+        snapshot = None
+        if self.trace_allocations:
+            tracemalloc.reset_peak()
+            snapshot = tracemalloc.take_snapshot()
+        wall, cpu = time.perf_counter(), time.process_time()
+        sampler.start()
+        try:
+            yield record
+        finally:
+            record["wall_seconds"] = time.perf_counter() - wall
+            record["cpu_seconds"] = time.process_time() - cpu
+            record["rss_start_bytes"] = rss_start
+            record["peak_rss_bytes"] = sampler.stop() or None
+            record["rss_end_bytes"] = current_rss()
+            record["max_rss_bytes"] = max_rss()
+            if snapshot is not None:
+                record["tracemalloc_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+                record["top_allocations"] = self._top_allocations(snapshot)
+            self.stages.append(record)
+
+    def _top_allocations(self, before):
+        diff = tracemalloc.take_snapshot().compare_to(before, "lineno")
+        diff.sort(key=lambda stat: stat.size_diff, reverse=True)
+        return [
+            {"location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+             "size_bytes": stat.size_diff, "count": stat.count_diff}
+            for stat in diff[:self.top_n] if stat.size_diff > 0
+        ]
+
+    def add(self, **facts):
+        """Run-level facts (dataset sizes, nnz, model size)."""
+        self.summary.update(facts)
+
+    def to_dict(self):
+        return {**self.meta, "total_wall_seconds": time.perf_counter() - self.started,
+                "summary": self.summary, "stages": self.stages}
+
+    def write(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+        print(f"wrote run report to {path}")
@@ -0,0 +1,213 @@
+"""
+Parallel hyperparameter sweep for the LightFM track model.
+
+The interaction / item-feature matrices are built once, written to .npy
+files and memory-mapped (copy-on-write) by every worker process, so each config
+only pays for its own training. Results are appended to a CSV as configs
+finish; re-running with the same --results file skips configs already in it
+(a config's id also covers the dataset and the run-level settings, so
+changing --epochs or the data trains everything again).
+
+    python sweep.py --dataset-path /data/MillionSongSubset --workers 4
+    python sweep.py --mode random --samples 20 --results random_sweep.csv
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from lightfm import LightFM
+
+import evaluation
+import features
+import pipeline
+import training
+
+SEARCH_SPACE = {
+    "loss": ["bpr", "warp"],
+    "no_components": [16, 25, 48, 64],
+    "learning_rate": [0.01, 0.05, 0.1],
+    "alpha": [0.0, 1e-6, 1e-5],
+}
+RESULTS_PATH = "sweep_results.csv"
+MATRICES = ("train", "valid", "item_features")
+
+# set in each worker by _init_worker
+_shared = {}
+
+
+def config_id(config, run=None):
+    """
+    Stable id used to recognise configs that already have results; `run` holds
+    the settings shared by the whole sweep (dataset fingerprint, epochs, ...).
+    """
+    key = {"config": config, "run": run} if run else config
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def grid_configs(space=SEARCH_SPACE):
+    names = sorted(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[n] for n in names))]
+
+
+def random_configs(n_samples, seed=0, space=SEARCH_SPACE):
+    """A reproducible sample of the grid, so resuming a random sweep sees the same configs."""
+    grid = grid_configs(space)
+    rng = np.random.RandomState(seed)
+    picked = rng.choice(len(grid), size=min(n_samples, len(grid)), replace=False)
+    return [grid[i] for i in sorted(picked)]
+
+
+def model_params(config):
+    """LightFM constructor arguments for a sweep config ('alpha' regularizes users and items)."""
+    params = {name: value for name, value in config.items() if name != "alpha"}
+    params["item_alpha"] = params["user_alpha"] = config.get("alpha", 0.0)
+    return params
+
+
+def save_shared(matrices, directory):
+    """Write CSR matrices as raw .npy arrays that workers can memory-map."""
+    for name, matrix in matrices.items():
+        matrix = matrix.tocsr()
+        np.save(os.path.join(directory, f"{name}.data.npy"), matrix.data.astype(np.float32))
+        np.save(os.path.join(directory, f"{name}.indices.npy"), matrix.indices)
+        np.save(os.path.join(directory, f"{name}.indptr.npy"), matrix.indptr)
+        np.save(os.path.join(directory, f"{name}.shape.npy"), np.array(matrix.shape))
+
+
+def load_shared(directory, name):
+    # copy-on-write maps: LightFM's Cython code wants writeable buffers but
+    # never writes to them, so the pages stay shared between workers
+    def part(suffix, mmap_mode="c"):
+        return np.load(os.path.join(directory, f"{name}.{suffix}.npy"), mmap_mode=mmap_mode)
+    return sp.csr_matrix((part("data"), part("indices"), part("indptr")),
+                         shape=tuple(part("shape", None)), copy=False)
+
+
+def _init_worker(directory):
+    for name in MATRICES:
+        _shared[name] = load_shared(directory, name)
+
+
+def run_config(config, run_id, epochs, patience, k, seed):
+    """Train and evaluate one config inside a worker process."""
+    train, valid, item_features = (_shared[name] for name in MATRICES)
+    model = LightFM(random_state=seed, **model_params(config))
+
+    start = time.perf_counter()
+    # one thread per worker: the pool already uses every core
+    model, history = training.fit_early_stopping(
+        model, train, valid, item_features, epochs=epochs, num_threads=1,
+        patience=patience, k=k, verbose=False,
+    )
+    wall_seconds = time.perf_counter() - start
+
+    metrics = evaluation.evaluate(model, valid, train_interactions=train, k=k,
+                                  item_features=item_features)
+    best = next(h for h in history if h["best"])
+    return {
+        "config_id": run_id,
+        **config,
+        **metrics,
+        "best_epoch": best["epoch"],
+        "epochs_run": len(history),
+        "train_seconds": sum(h["fit_seconds"] for h in history),
+        "wall_seconds": wall_seconds,
+        "model_bytes": len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)),
+    }
+
+
+def completed_ids(results_path):
+    if not os.path.exists(results_path):
+        return set()
+    return set(pd.read_csv(results_path, usecols=["config_id"])["config_id"].astype(str))
+
+
+def append_result(results_path, row):
+    pd.DataFrame([row]).to_csv(results_path, mode="a", index=False,
+                               header=not os.path.exists(results_path))
+
+
+def run_sweep(df_tracks, configs, results_path=RESULTS_PATH, workers=None, epochs=training.MAX_EPOCHS,
+              patience=training.PATIENCE, k=5, valid_fraction=0.2, seed=42, n_bins=features.DEFAULT_N_BINS,
+              dataset=None):
+    """`dataset` identifies the data behind df_tracks (see pipeline.fingerprint_files)."""
+    run = {"dataset": dataset, "epochs": epochs, "patience": patience, "k": k,
+           "valid_fraction": valid_fraction, "seed": seed, "n_bins": n_bins}
+    done = completed_ids(results_path)
+    pending = [c for c in configs if config_id(c, run) not in done]
+    print(f"{len(configs)} configs, {len(configs) - len(pending)} already in {results_path}")
+    if not pending:
+        return pd.read_csv(results_path)
+
+    encoder = features.fit_encoder(df_tracks, n_bins=n_bins)
+    dataset, item_features = training.build_encoded_dataset(df_tracks, encoder)
+    interactions = training.build_interactions(dataset, df_tracks)
+    train, valid = training.split_interactions(interactions, valid_fraction, seed)
+
+    shared_dir = tempfile.mkdtemp(prefix="lightfm_sweep_")
+    try:
+        save_shared({"train": train, "valid": valid, "item_features": item_features}, shared_dir)
+        with ProcessPoolExecutor(max_workers=workers or training.NUM_THREADS,
+                                 initializer=_init_worker, initargs=(shared_dir,)) as pool:
+            futures = {pool.submit(run_config, c, config_id(c, run), epochs, patience, k, seed): c
+                       for c in pending}
+            for n, future in enumerate(as_completed(futures), 1):
+                config = futures[future]
+                try:
+                    row = future.result()
+                except Exception as e:
+                    print(f"[{n}/{len(pending)}] {config} failed: {e}")
+                    continue
+                append_result(results_path, row)
+                print(f"[{n}/{len(pending)}] {config}  auc={row['auc']:.4f}  "
+                      f"precision@{k}={row[f'precision@{k}']:.4f}  {row['train_seconds']:.1f}s")
+    finally:
+        shutil.rmtree(shared_dir, ignore_errors=True)
+
+    return pd.read_csv(results_path) if os.path.exists(results_path) else pd.DataFrame()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hyperparameter sweep for the LightFM model")
+    parser.add_argument("--dataset-path", default=training.DATASET_PATH)
+    parser.add_argument("--results", default=RESULTS_PATH)
+    parser.add_argument("--mode", choices=["grid", "random"], default="grid")
+    parser.add_argument("--samples", type=int, default=20, help="configs to draw in random mode")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--epochs", type=int, default=training.MAX_EPOCHS)
+    parser.add_argument("--patience", type=int, default=training.PATIENCE)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--valid-fraction", type=float, default=0.2)
+    parser.add_argument("--n-bins", type=int, default=features.DEFAULT_N_BINS)
+    args = parser.parse_args()
+
+    if args.mode == "grid":
+        configs = grid_configs()
+    else:
+        configs = random_configs(args.samples, seed=args.seed)
+
+    df_tracks = training.load_tracks(args.dataset_path)
+    results = run_sweep(df_tracks, configs, results_path=args.results, workers=args.workers,
+                        epochs=args.epochs, patience=args.patience, k=args.k, seed=args.seed,
+                        valid_fraction=args.valid_fraction, n_bins=args.n_bins,
+                        dataset=pipeline.fingerprint_files(args.dataset_path, ".h5"))
+
+    if not results.empty:
+        print("\nTop configs by AUC:")
+        print(results.sort_values("auc", ascending=False).head(10).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Deterministic synthetic Million Song Dataset generator.
+
+Writes MSD-layout track files (<root>/A/B/C/TR....h5, one row in
+metadata/songs and analysis/songs each) and/or a single summary file holding
+every track in one row each, with the fields extract_track_info reads. The
+same seed and sizes always produce the same data, so ingestion, training and
+serving can be benchmarked at any scale without the real dataset.
+
+    python synth_msd.py --output /tmp/msd_100k --tracks 100000 --artists 8000
+    python synth_msd.py --output /tmp/msd_1m --tracks 1000000 --artists 50000 --summary-only
+    python training.py --dataset-path /tmp/msd_1m/msd_summary_file.h5
+"""
+
+import argparse
+import os
+import time
+
+import h5py
+import numpy as np
+
+SUMMARY_FILE = "msd_summary_file.h5"
+
+METADATA_DTYPE = np.dtype([
+    ("artist_id", "S18"),
+    ("artist_name", "S64"),
+    ("genre", "S16"),
+    ("release", "S64"),
+    ("song_id", "S18"),
+    ("title", "S64"),
+    ("artist_familiarity", "<f8"),
+    ("artist_hotttnesss", "<f8"),
+    ("song_hotttnesss", "<f8"),
+])
+ANALYSIS_DTYPE = np.dtype([
+    ("duration", "<f8"),
+    ("key", "<i4"),
+    ("key_confidence", "<f8"),
+    ("loudness", "<f8"),
+    ("mode", "<i4"),
+    ("mode_confidence", "<f8"),
+    ("tempo", "<f8"),
+    ("time_signature", "<i4"),
+    ("time_signature_confidence", "<f8"),
+    ("track_id", "S18"),
+])
+
+GENRES = np.array([b"rock", b"pop", b"electronic", b"hip hop", b"jazz", b"folk", b"metal", b"blues", b""])
+TIME_SIGNATURES = np.array([1, 3, 4, 5, 7])
+TIME_SIGNATURE_P = np.array([0.03, 0.12, 0.78, 0.05, 0.02])
+
+# odd multiplier: a bijection on 64-bit ints that spreads sequential ids over
+# the leading hex digits, so the A/B/C directories fill evenly as in the MSD
+_ID_MULTIPLIER = 0x9E3779B97F4A7C15
+
+
+def make_id(prefix, index):
+    return f"{prefix}{(int(index) * _ID_MULTIPLIER) & 0xFFFFFFFFFFFFFFFF:016X}"
+
+
+def track_path(root, track_id):
+    return os.path.join(root, track_id[2], track_id[3], track_id[4], f"{track_id}.h5")
+
+
+def artist_weights(n_artists, skew):
+    """Zipf-like share of the catalogue per artist; skew=0 spreads tracks evenly."""
+    weights = 1.0 / np.arange(1, n_artists + 1) ** skew
+    return weights / weights.sum()
+
+
+def generate(n_tracks, n_artists, seed=0, skew=1.0, tempo_spread=8.0, loudness_spread=2.0):
+    """(metadata, analysis) structured arrays with one row per track."""
+    rng = np.random.default_rng(seed)
+
+    # every artist gets a style the audio features of its tracks scatter around,
+    # so artists are learnable from content rather than pure noise
+    artist_tempo = rng.normal(120, 25, n_artists).clip(50, 220)
+    artist_loudness = rng.normal(-10, 4, n_artists).clip(-35, 0)
+    artist_duration = rng.lognormal(np.log(230), 0.25, n_artists)
+    artist_key = rng.integers(0, 12, n_artists)
+    artist_major = rng.uniform(0.3, 0.9, n_artists)
+    artist_genre = rng.integers(0, len(GENRES), n_artists)
+    artist_familiarity = rng.beta(2, 3, n_artists)
+
+    # permute so the most prolific artists are not simply the lowest ids
+    artist = rng.permutation(n_artists)[rng.choice(n_artists, size=n_tracks, p=artist_weights(n_artists, skew))]
+
+    meta = np.zeros(n_tracks, dtype=METADATA_DTYPE)
+    meta["artist_id"] = [make_id("AR", a).encode() for a in artist]
+    meta["artist_name"] = [f"Synthetic Artist {a}".encode() for a in artist]
+    meta["genre"] = GENRES[artist_genre[artist]]
+    meta["release"] = [f"Release {a}-{r}".encode() for a, r in zip(artist, rng.integers(0, 8, n_tracks))]
+    meta["song_id"] = [make_id("SO", i).encode() for i in range(n_tracks)]
+    meta["title"] = [f"Track {i}".encode() for i in range(n_tracks)]
+    meta["artist_familiarity"] = artist_familiarity[artist]
+    meta["artist_hotttnesss"] = (artist_familiarity[artist] * 0.8 + rng.uniform(0, 0.2, n_tracks))
+    meta["song_hotttnesss"] = rng.beta(2, 5, n_tracks)
+
+    analysis = np.zeros(n_tracks, dtype=ANALYSIS_DTYPE)
+    analysis["track_id"] = [make_id("TR", i).encode() for i in range(n_tracks)]
+    analysis["tempo"] = rng.normal(artist_tempo[artist], tempo_spread).clip(30, 250)
+    analysis["loudness"] = rng.normal(artist_loudness[artist], loudness_spread).clip(-50, 2)
+    analysis["duration"] = rng.lognormal(np.log(artist_duration[artist]), 0.2)
+    # half the tracks sit in the artist's usual key
+    analysis["key"] = np.where(rng.random(n_tracks) < 0.5, artist_key[artist], rng.integers(0, 12, n_tracks))
+    analysis["mode"] = rng.random(n_tracks) < artist_major[artist]
+    analysis["time_signature"] = rng.choice(TIME_SIGNATURES, size=n_tracks, p=TIME_SIGNATURE_P)
+    for field in ("key_confidence", "mode_confidence", "time_signature_confidence"):
+        analysis[field] = rng.uniform(0, 1, n_tracks)
+    return meta, analysis
+
+
+def write_track_files(root, meta, analysis):
+    start = time.perf_counter()
+    for i in range(len(meta)):
+        track_id = analysis["track_id"][i].decode()
+        path = track_path(root, track_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with h5py.File(path, "w") as f:
+            f.create_dataset("metadata/songs", data=meta[i:i + 1])
+            f.create_dataset("analysis/songs", data=analysis[i:i + 1])
+        if (i + 1) % 10000 == 0:
+            print(f"  {i + 1}/{len(meta)} track files ({time.perf_counter() - start:.0f}s)")
+
+
+def write_summary(path, meta, analysis):
+    """All tracks in one file, one row per track, like msd_summary_file.h5."""
+    with h5py.File(path, "w") as f:
+        f.create_dataset("metadata/songs", data=meta, chunks=True, compression="gzip")
+        f.create_dataset("analysis/songs", data=analysis, chunks=True, compression="gzip")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic MSD-layout dataset")
+    parser.add_argument("--output", required=True, help="root directory to write into")
+    parser.add_argument("--tracks", type=int, default=10000)
+    parser.add_argument("--artists", type=int, default=1000)
+    parser.add_argument("--skew", type=float, default=1.0,
+                        help="Zipf exponent of tracks per artist (0 = uniform)")
+    parser.add_argument("--tempo-spread", type=float, default=8.0,
+                        help="std-dev of a track's tempo around its artist's")
+    parser.add_argument("--loudness-spread", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--summary", action="store_true", help=f"also write {SUMMARY_FILE}")
+    parser.add_argument("--summary-only", action="store_true",
+                        help="write only the summary file (much faster at 1M tracks)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    meta, analysis = generate(args.tracks, args.artists, seed=args.seed, skew=args.skew,
+                              tempo_spread=args.tempo_spread, loudness_spread=args.loudness_spread)
+    print(f"generated {args.tracks} tracks by {len(np.unique(meta['artist_id']))} artists "
+          f"in {time.perf_counter() - start:.1f}s")
+
+    os.makedirs(args.output, exist_ok=True)
+    if not args.summary_only:
+        write_track_files(os.path.join(args.output, "data"), meta, analysis)
+    if args.summary or args.summary_only:
+        write_summary(os.path.join(args.output, SUMMARY_FILE), meta, analysis)
+    print(f"wrote {args.output} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,42 @@
 # %% Fixed training code
+import argparse
+import copy
+import functools
 import os
+import time
 import h5py
 import numpy as np
 import pandas as pd
+import scipy.sparse as sp
 from lightfm import LightFM
+from lightfm.cross_validation import random_train_test_split
 from lightfm.data import Dataset
 import pickle
 
+import content_index
+import evaluation
+import features
+import neighbors
+import pipeline
+import profiling
+
 # %%
 DATASET_PATH = "/data/MillionSongSubset"
-MODEL_PATH = "/api/lightfm_msd_model.pkl"
-SAVE_DATASET_PATH = '/api/lightfm_dataset.pkl'
+OUTPUT_DIR = "/api"  # api/main.py loads the artifacts from its own folder
+MODEL_FILE = "lightfm_msd_model.pkl"
+DATASET_FILE = "lightfm_dataset.pkl"
+ITEM_FEATURES_FILE = "lightfm_item_features.npz"
+INTERACTIONS_FILE = "lightfm_interactions.npz"
+NEIGHBORS_FILE = "lightfm_item_neighbors.npy"
+NEIGHBOR_SCORES_FILE = "lightfm_item_neighbor_scores.npy"
+CONTENT_INDEX_FILE = "lightfm_content_index.pkl"
+
+MAX_EPOCHS = 30
+PATIENCE = 3
+INCREMENTAL_EPOCHS = 5
+NEIGHBORS_K = 50
+NUM_THREADS = os.cpu_count() or 1
+DEFAULT_MODEL_PARAMS = {"loss": "bpr", "no_components": 25}
 
 # %% [markdown]
 # read all .h5 files
@@ -31,7 +57,7 @@ def extract_track_info(h5_file):
         meta = f['metadata/songs'][0]
         artist_name = safe_decode(meta['artist_name'])
         genre = safe_decode(meta['genre']) if 'genre' in meta.dtype.names else "unknown"
-        
+
         # Analysis features
         analysis = f['analysis/songs'][0]
         track_id = safe_decode(analysis['track_id'])
@@ -41,7 +67,7 @@ def extract_track_info(h5_file):
         key = analysis['key']
         mode = analysis['mode']
         time_signature = analysis['time_signature']
-        
+
     return {
         "track_id": track_id,
         "artist_name": artist_name,
@@ -53,90 +79,562 @@ def extract_track_info(h5_file):
         "time_signature": time_signature
     }
 
-# %%
-# read files, load into df
-tracks = []
-for root, dirs, files in os.walk(DATASET_PATH):
-    for file in files:
-        if file.endswith(".h5"):
-            file_path = os.path.join(root, file)
-            try:
-                info = extract_track_info(file_path)
-                tracks.append(info)
-            except Exception as e:
-                print(f"Failed to read {file_path}: {e}")
-
-df_tracks = pd.DataFrame(tracks)
-print(f"Loaded {len(df_tracks)} tracks")
+def load_summary(summary_path):
+    """Read a summary .h5 file (one row per track) into a track DataFrame."""
+    with h5py.File(summary_path, "r") as f:
+        meta = f['metadata/songs'][:]
+        analysis = f['analysis/songs'][:]
 
+    df_tracks = pd.DataFrame({
+        "track_id": np.char.decode(analysis['track_id'], 'utf-8'),
+        "artist_name": np.char.decode(meta['artist_name'], 'utf-8'),
+        **{name: analysis[name] for name in features.AUDIO_FEATURES},
+    })
+    print(f"Loaded {len(df_tracks)} tracks from {summary_path}")
+    return df_tracks
 
-# %%
-# prepare item features
-all_item_features = set()
-item_features_list = []
-
-for row in df_tracks.itertuples(index=False):
-    features = {
-        "tempo": row.tempo,
-        "loudness": row.loudness,
-        "duration": row.duration,
-        "key": row.key,
-        "mode": row.mode,
-        "time_signature": row.time_signature
-    }
-    all_item_features.update(features.keys())
-    item_features_list.append((row.track_id, features))
+def load_tracks(dataset_path=DATASET_PATH):
+    """Read every .h5 file under dataset_path (or one summary .h5 file) into a track DataFrame."""
+    if os.path.isfile(dataset_path):
+        return load_summary(dataset_path)
 
-print(f"Created {len(all_item_features)} unique features")
+    tracks = []
+    for root, dirs, files in os.walk(dataset_path):
+        for file in files:
+            if file.endswith(".h5"):
+                file_path = os.path.join(root, file)
+                try:
+                    info = extract_track_info(file_path)
+                    tracks.append(info)
+                except Exception as e:
+                    print(f"Failed to read {file_path}: {e}")
 
+    df_tracks = pd.DataFrame(tracks)
+    print(f"Loaded {len(df_tracks)} tracks")
+    return df_tracks
 
+# %% [markdown]
+# build dataset, interactions and item features
 
 # %%
-# fit dataset with users, items, and features
-dataset = Dataset()
-dataset.fit(
-    users=df_tracks['artist_name'].unique(),
-    items=df_tracks['track_id'].tolist(),
-    item_features=list(all_item_features)
-)
-
-users = df_tracks['artist_name'].unique().tolist()  # using artists as users
-items = df_tracks['track_id'].tolist()
-user_item_pairs = list(df_tracks[['artist_name', 'track_id']].itertuples(index=False, name=None))
-interactions, weights = dataset.build_interactions(user_item_pairs)
-print('created user-item matrix')
-
-# save dataset with correct counts
-with open(SAVE_DATASET_PATH, "wb") as f:
-    pickle.dump({
-        "dataset": dataset,
-        "num_items": len(users),
-        "num_users": len(items),
-        "num_item_features": len(all_item_features)
-    }, f)
-
-# build item features
-item_features = dataset.build_item_features(item_features_list)
-print('built item features')
+def build_dataset(df_tracks, item_feature_names):
+    """Fit a LightFM Dataset with artists as users and tracks as items."""
+    dataset = Dataset()
+    dataset.fit(
+        users=df_tracks['artist_name'].unique(),
+        items=df_tracks['track_id'].tolist(),
+        item_features=item_feature_names
+    )
+    return dataset
+
+def build_interactions(dataset, df_tracks):
+    """Build the artist x track interaction matrix."""
+    user_item_pairs = list(df_tracks[['artist_name', 'track_id']].itertuples(index=False, name=None))
+    interactions, weights = dataset.build_interactions(user_item_pairs)
+    print('created user-item matrix')
+    return interactions
+
+def build_legacy_dataset(df_tracks):
+    """Dataset and item features using the raw-valued encoding (for comparisons)."""
+    dataset = build_dataset(df_tracks, list(features.AUDIO_FEATURES))
+    item_features = dataset.build_item_features(features.legacy_item_features(df_tracks))
+    return dataset, item_features
+
+def build_encoded_dataset(df_tracks, encoder):
+    """Dataset and item features using the binned / one-hot encoding."""
+    dataset = build_dataset(df_tracks, features.feature_names(encoder))
+    item_features = features.build_item_feature_matrix(dataset, df_tracks, encoder)
+    return dataset, item_features
 
 # %% [markdown]
 # training
 
 # %%
-model = LightFM(loss='bpr', no_components=25)
-model.fit(interactions, item_features=item_features, epochs=12, num_threads=1)
+def split_interactions(interactions, valid_fraction=0.2, seed=42):
+    """Hold out a random fraction of interactions for validation."""
+    return random_train_test_split(
+        interactions, test_percentage=valid_fraction, random_state=np.random.RandomState(seed)
+    )
+
+def evaluate_epoch(model, train, valid, item_features, k):
+    """Held-out precision@k and AUC, ignoring items already seen in training."""
+    metrics = evaluation.evaluate(model, valid, train_interactions=train, k=k, item_features=item_features)
+    return {f"precision@{k}": metrics[f"precision@{k}"], "auc": metrics["auc"]}
+
+def fit_early_stopping(model, train, valid, item_features, epochs=MAX_EPOCHS,
+                       num_threads=NUM_THREADS, patience=PATIENCE, min_delta=1e-3, k=5,
+                       verbose=True):
+    """
+    Run fit_partial one epoch at a time, scoring the valid split after each.
+
+    Stops once neither precision@k nor AUC has improved by min_delta for
+    `patience` epochs and returns (best_model, history), where history holds
+    per-epoch timings and metrics.
+    """
+    history = []
+    best_model, best_metrics, best_epoch, stale_epochs = None, None, 0, 0
+
+    for epoch in range(1, epochs + 1):
+        start = time.perf_counter()
+        model.fit_partial(train, item_features=item_features, epochs=1, num_threads=num_threads)
+        fit_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        metrics = evaluate_epoch(model, train, valid, item_features, k)
+        eval_seconds = time.perf_counter() - start
+
+        history.append({"epoch": epoch, "fit_seconds": fit_seconds,
+                        "eval_seconds": eval_seconds, **metrics})
+        if verbose:
+            print(f"epoch {epoch:>3}  fit {fit_seconds:6.2f}s  eval {eval_seconds:6.2f}s  "
+                  + "  ".join(f"{name}={value:.4f}" for name, value in metrics.items()))
+
+        improved = best_metrics is None or any(
+            metrics[name] > best_metrics[name] + min_delta for name in metrics
+        )
+        if improved:
+            best_model, best_metrics, best_epoch, stale_epochs = copy.deepcopy(model), metrics, epoch, 0
+        else:
+            stale_epochs += 1
+            if patience and stale_epochs >= patience:
+                if verbose:
+                    print(f"no improvement for {patience} epochs, stopping early")
+                break
+
+    for h in history:
+        h["best"] = h["epoch"] == best_epoch
+    if verbose:
+        print(f"trained model: best epoch {best_epoch}/{len(history)} "
+              f"({sum(h['fit_seconds'] for h in history):.2f}s fitting on {num_threads} threads)")
+    return best_model, history
+
+def train_model(interactions, item_features, epochs=MAX_EPOCHS, num_threads=NUM_THREADS,
+                valid_fraction=0.2, patience=PATIENCE, min_delta=1e-3, k=5, seed=42,
+                model_params=None):
+    """
+    Train a LightFM model with early stopping on a held-out split.
+
+    A random valid_fraction of the interactions is held out and scored after
+    every epoch (see fit_early_stopping). With valid_fraction=0 the model is
+    trained on everything for exactly `epochs`. model_params override
+    DEFAULT_MODEL_PARAMS. Returns (model, history).
+    """
+    model = LightFM(random_state=seed, **{**DEFAULT_MODEL_PARAMS, **(model_params or {})})
+
+    if not valid_fraction:
+        start = time.perf_counter()
+        model.fit(interactions, item_features=item_features, epochs=epochs, num_threads=num_threads)
+        print(f"trained model for {epochs} epochs in {time.perf_counter() - start:.2f}s")
+        return model, []
+
+    train, valid = split_interactions(interactions, valid_fraction, seed)
+    return fit_early_stopping(model, train, valid, item_features, epochs=epochs,
+                              num_threads=num_threads, patience=patience,
+                              min_delta=min_delta, k=k)
+
+def save_artifacts(model, dataset, encoder, item_features, interactions, output_dir=OUTPUT_DIR,
+                   neighbors_k=NEIGHBORS_K, content=None):
+    """
+    Write the model, dataset, item feature and interaction matrices, the item
+    neighbour table and (if given) the audio-feature content index where
+    api/main.py loads them.
+    """
+    num_users, num_items = dataset.interactions_shape()
+
+    with open(os.path.join(output_dir, DATASET_FILE), "wb") as f:
+        pickle.dump({
+            "dataset": dataset,
+            "num_items": num_items,
+            "num_users": num_users,
+            "num_item_features": len(features.feature_names(encoder)),
+            "feature_encoder": encoder,
+        }, f)
+
+    # the encoded matrix is stored next to the model so the API can compute
+    # item representations once at startup instead of rebuilding features
+    sp.save_npz(os.path.join(output_dir, ITEM_FEATURES_FILE), item_features.tocsr())
+    sp.save_npz(os.path.join(output_dir, INTERACTIONS_FILE), interactions.tocsr())
+
+    # "more like this track" lists, memory-mapped by the API's /similar
+    if neighbors_k:
+        _, item_embeddings = model.get_item_representations(item_features)
+        indices, scores = neighbors.build_neighbor_table(item_embeddings, k=neighbors_k)
+        np.save(os.path.join(output_dir, NEIGHBORS_FILE), indices)
+        np.save(os.path.join(output_dir, NEIGHBOR_SCORES_FILE), scores)
+
+    # cold-start fallback for artists the model has never seen
+    if content is not None:
+        with open(os.path.join(output_dir, CONTENT_INDEX_FILE), "wb") as f:
+            pickle.dump(content, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    with open(os.path.join(output_dir, MODEL_FILE), "wb") as f:
+        pickle.dump((model, dataset), f)
+    print('saved model')
+
+# %% [markdown]
+# incremental (warm-start) retraining
 
 # %%
-print('trained model')
+def load_artifacts(output_dir=OUTPUT_DIR):
+    """Load what save_artifacts wrote: (model, dataset, encoder, item_features, interactions)."""
+    with open(os.path.join(output_dir, MODEL_FILE), "rb") as f:
+        model, dataset = pickle.load(f)
+    with open(os.path.join(output_dir, DATASET_FILE), "rb") as f:
+        encoder = pickle.load(f).get("feature_encoder")
+    if encoder is None:
+        raise ValueError("artifacts predate the binned feature encoder; run a full training first")
+
+    item_features = sp.load_npz(os.path.join(output_dir, ITEM_FEATURES_FILE)).tocsr()
+    interactions_path = os.path.join(output_dir, INTERACTIONS_FILE)
+    if os.path.exists(interactions_path):
+        interactions = sp.load_npz(interactions_path).tocsr()
+    else:
+        print("No saved interactions found; only new tracks' interactions will be kept")
+        interactions = sp.csr_matrix(dataset.interactions_shape(), dtype=np.float32)
+    return model, dataset, encoder, item_features, interactions
+
+def pad_csr(matrix, shape):
+    """Grow a CSR matrix with empty rows/columns; existing indices are unchanged."""
+    matrix = matrix.tocsr()
+    indptr = np.concatenate([matrix.indptr, np.full(shape[0] - matrix.shape[0], matrix.indptr[-1])])
+    return sp.csr_matrix((matrix.data, matrix.indices, indptr), shape=shape)
+
+def grow_model(model, n_item_features, n_user_features):
+    """
+    Append rows for features added to the Dataset since the model was trained,
+    initialised the same way LightFM._initialize does. Existing rows (and their
+    optimiser state) are kept, so fit_partial continues from the old parameters.
+    """
+    d = model.no_components
+    gradient_init = 1.0 if model.learning_schedule == "adagrad" else 0.0
+
+    for prefix, n_features in (("item", n_item_features), ("user", n_user_features)):
+        embeddings = getattr(model, f"{prefix}_embeddings")
+        n_new = n_features - embeddings.shape[0]
+        if n_new <= 0:
+            continue
+        new_embeddings = ((model.random_state.rand(n_new, d) - 0.5) / d).astype(np.float32)
+        grown = {
+            "embeddings": new_embeddings,
+            "embedding_gradients": np.full((n_new, d), gradient_init, dtype=np.float32),
+            "embedding_momentum": np.zeros((n_new, d), dtype=np.float32),
+            "biases": np.zeros(n_new, dtype=np.float32),
+            "bias_gradients": np.full(n_new, gradient_init, dtype=np.float32),
+            "bias_momentum": np.zeros(n_new, dtype=np.float32),
+        }
+        for name, rows in grown.items():
+            attr = f"{prefix}_{name}"
+            setattr(model, attr, np.ascontiguousarray(np.concatenate([getattr(model, attr), rows])))
+    return model
+
+def incremental_update(df_tracks, output_dir=OUTPUT_DIR, epochs=INCREMENTAL_EPOCHS,
+                       num_threads=NUM_THREADS):
+    """
+    Add tracks (and their artists) to an existing model without a full retrain.
+
+    The Dataset mappings are extended in place (old ids keep their indices),
+    the embedding matrices grow to match, and fit_partial runs for `epochs`
+    on every interaction of the artists that received new tracks. The item
+    features use the stored encoder, so bin edges do not move.
+    """
+    model, dataset, encoder, old_item_features, old_interactions = load_artifacts(output_dir)
+    user_mapping, _, item_mapping, _ = dataset.mapping()
+
+    df_new = df_tracks[~df_tracks["track_id"].isin(item_mapping)].drop_duplicates("track_id")
+    if df_new.empty:
+        print("No new tracks to add")
+        return model
+    new_artists = [a for a in df_new["artist_name"].unique() if a not in user_mapping]
+
+    # unseen key/mode/time_signature levels become new one-hot features
+    old_names = set(features.feature_names(encoder))
+    for name in features.CATEGORICAL_FEATURES:
+        levels = np.union1d(encoder["categories"][name], df_new[name].to_numpy(dtype=np.int64))
+        encoder["categories"][name] = levels
+    new_feature_names = [n for n in features.feature_names(encoder) if n not in old_names]
+
+    dataset.fit_partial(users=new_artists, items=df_new["track_id"].tolist(),
+                        item_features=new_feature_names)
+    n_users, n_items = dataset.interactions_shape()
+    n_item_features = dataset.item_features_shape()[1]
+    print(f"Adding {len(df_new)} tracks, {len(new_artists)} artists, "
+          f"{len(new_feature_names)} features -> {n_users} users, {n_items} items")
+
+    item_features = (pad_csr(old_item_features, (n_items, n_item_features))
+                     + features.build_item_feature_matrix(dataset, df_new, encoder)).tocsr()
+    interactions = (pad_csr(old_interactions, (n_users, n_items))
+                    + build_interactions(dataset, df_new).tocsr()).tocsr()
+    interactions.data[:] = 1.0
+
+    grow_model(model, n_item_features, dataset.user_features_shape()[1])
+
+    content = None
+    content_path = os.path.join(output_dir, CONTENT_INDEX_FILE)
+    if os.path.exists(content_path):
+        with open(content_path, "rb") as f:
+            content = content_index.extend_content_index(pickle.load(f), dataset, df_new)
+
+    user_mapping = dataset.mapping()[0]
+    affected = np.zeros(n_users, dtype=np.float32)
+    affected[[user_mapping[a] for a in df_new["artist_name"].unique()]] = 1.0
+    affected_interactions = sp.diags(affected) @ interactions
+
+    start = time.perf_counter()
+    model.fit_partial(affected_interactions.tocoo(), item_features=item_features,
+                      epochs=epochs, num_threads=num_threads)
+    print(f"warm-started {epochs} epochs on {affected_interactions.nnz} interactions "
+          f"in {time.perf_counter() - start:.2f}s")
+
+    save_artifacts(model, dataset, encoder, item_features, interactions, output_dir, content=content)
+    return model
+
+# %% [markdown]
+# encoding comparison
+
+# %%
+def compare_encodings(df_tracks, epochs=12, k=5, num_threads=NUM_THREADS, seed=42):
+    """
+    Train the same model on the raw-valued and the binned encodings and report
+    encoding time, per-epoch fit time, scoring time and held-out AUC / precision@k.
+    """
+    results = {}
+    builders = {
+        "legacy": build_legacy_dataset,
+        "binned": lambda df: build_encoded_dataset(df, features.fit_encoder(df)),
+    }
+
+    for name, build in builders.items():
+        start = time.perf_counter()
+        dataset, item_features = build(df_tracks)
+        encode_seconds = time.perf_counter() - start
+
+        interactions = build_interactions(dataset, df_tracks)
+        # patience=None trains every epoch so both curves cover the same range
+        model, history = train_model(interactions, item_features, epochs=epochs, k=k,
+                                     num_threads=num_threads, patience=None, seed=seed)
+        auc_history = [h["auc"] for h in history]
+
+        start = time.perf_counter()
+        n_users, n_items = interactions.shape
+        for user_id in range(min(n_users, 100)):
+            model.predict(user_id, np.arange(n_items), item_features=item_features)
+        predict_ms = (time.perf_counter() - start) * 1000 / min(n_users, 100)
+
+        best = max(history, key=lambda h: h["auc"])
+        results[name] = {
+            "n_item_features": item_features.shape[1],
+            "feature_nnz": item_features.nnz,
+            "encode_seconds": encode_seconds,
+            "fit_seconds": sum(h["fit_seconds"] for h in history),
+            "predict_ms_per_user": predict_ms,
+            "auc": best["auc"],
+            f"precision@{k}": best[f"precision@{k}"],
+            # first epoch within 0.01 of the best AUC seen
+            "epochs_to_converge": next(i + 1 for i, a in enumerate(auc_history) if a >= best["auc"] - 0.01),
+            "auc_history": auc_history,
+        }
+
+    print(f"\n{'metric':<22}{'legacy':>14}{'binned':>14}")
+    for metric in results["legacy"]:
+        if metric == "auc_history":
+            continue
+        legacy, binned = results["legacy"][metric], results["binned"][metric]
+        print(f"{metric:<22}{legacy:>14.4f}{binned:>14.4f}")
+    return results
+
+# %% [markdown]
+# staged pipeline: ingest -> encode -> matrices -> train -> evaluate -> export
 
 # %%
-with open(MODEL_PATH, "wb") as f:
-    pickle.dump((model, dataset), f)
+STAGES = ("ingest", "encode", "matrices", "train", "evaluate", "export")
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+
+def stage_ingest(config):
+    return load_tracks(config["dataset_path"])
+
+def stage_encode(config, df_tracks):
+    encoder = features.fit_encoder(df_tracks, n_bins=config["n_bins"])
+    dataset, item_features = build_encoded_dataset(df_tracks, encoder)
+    print(f"Created {len(features.feature_names(encoder))} unique features")
+    return {"encoder": encoder, "dataset": dataset, "item_features": item_features}
+
+def stage_matrices(config, df_tracks, encoded):
+    return {"interactions": build_interactions(encoded["dataset"], df_tracks)}
+
+def stage_train(config, encoded, matrices, num_threads=NUM_THREADS):
+    model, history = train_model(matrices["interactions"], encoded["item_features"],
+                                 epochs=config["epochs"], num_threads=num_threads,
+                                 valid_fraction=config["valid_fraction"], patience=config["patience"],
+                                 seed=config["seed"], model_params=config["model_params"])
+    if not (config["valid_fraction"] and config["refit"]):
+        return {"model": model, "history": history}
+
+    # the early-stopping model never saw the held-out interactions (an artist
+    # whose only track was held out would be served random embeddings), so the
+    # exported model is refit on all of them for the best epoch count; the
+    # holdout model is kept for the evaluate stage
+    best_epoch = next(h["epoch"] for h in history if h["best"])
+    refit, _ = train_model(matrices["interactions"], encoded["item_features"], epochs=best_epoch,
+                           num_threads=num_threads, valid_fraction=0, seed=config["seed"],
+                           model_params=config["model_params"])
+    return {"model": refit, "holdout_model": model, "history": history}
+
+def stage_evaluate(config, encoded, matrices, trained, check=False, num_threads=NUM_THREADS):
+    if not config["valid_fraction"]:
+        print("no validation split, skipping evaluation")
+        return {}
+    train, valid = split_interactions(matrices["interactions"], config["valid_fraction"], config["seed"])
+    model = trained.get("holdout_model", trained["model"])
+    metrics = evaluation.evaluate(model, valid, train_interactions=train, k=config["k"],
+                                  item_features=encoded["item_features"])
+    print("  ".join(f"{name}={value:.4f}" for name, value in metrics.items()))
+    if check:
+        evaluation.compare_with_lightfm(model, valid, train, k=config["k"],
+                                        item_features=encoded["item_features"], num_threads=num_threads)
+    return metrics
+
+def stage_export(config, df_tracks, encoded, matrices, trained):
+    content = content_index.build_content_index(encoded["dataset"], df_tracks)
+    save_artifacts(trained["model"], encoded["dataset"], encoded["encoder"],
+                   encoded["item_features"], matrices["interactions"], config["output_dir"],
+                   neighbors_k=config["neighbors_k"], content=content)
+    return {"output_dir": config["output_dir"]}
+
+def run_summary(outputs):
+    """Dataset, matrix and model sizes for the run report."""
+    summary = {}
+    if "ingest" in outputs:
+        df_tracks = outputs["ingest"]
+        summary.update(n_tracks=len(df_tracks), n_artists=int(df_tracks["artist_name"].nunique()))
+    if "encode" in outputs:
+        item_features = outputs["encode"]["item_features"]
+        summary.update(item_features_shape=list(item_features.shape), item_features_nnz=int(item_features.nnz))
+    if "matrices" in outputs:
+        interactions = outputs["matrices"]["interactions"]
+        summary.update(interactions_shape=list(interactions.shape), interactions_nnz=int(interactions.nnz))
+    if "train" in outputs:
+        model = outputs["train"]["model"]
+        summary.update(model_bytes=len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)),
+                       epochs_run=len(outputs["train"]["history"]))
+    if "evaluate" in outputs:
+        summary["metrics"] = outputs["evaluate"]
+    if "export" in outputs:
+        output_dir = outputs["export"]["output_dir"]
+        summary["artifact_bytes"] = {
+            name: os.path.getsize(os.path.join(output_dir, name))
+            for name in (MODEL_FILE, DATASET_FILE, ITEM_FEATURES_FILE, INTERACTIONS_FILE,
+                         NEIGHBORS_FILE, NEIGHBOR_SCORES_FILE, CONTENT_INDEX_FILE)
+            if os.path.exists(os.path.join(output_dir, name))
+        }
+    return summary
+
+def model_params_from_args(args):
+    """LightFM constructor arguments from the CLI ('alpha' regularizes users and items, as in sweep.py)."""
+    return {
+        "loss": args.loss, "no_components": args.no_components,
+        "learning_rate": args.learning_rate, "item_alpha": args.alpha, "user_alpha": args.alpha,
+    }
+
+def build_stages(args):
+    """Pipeline stages; each config holds exactly what its output depends on."""
+    run_time = dict(num_threads=args.num_threads)  # affects speed, not results: not hashed
+    training_config = {
+        "epochs": args.epochs, "patience": args.patience, "valid_fraction": args.valid_fraction,
+        "seed": args.seed, "model_params": model_params_from_args(args), "refit": not args.no_refit,
+    }
+    return [
+        pipeline.Stage("ingest", stage_ingest, (), {
+            "dataset_path": os.path.abspath(args.dataset_path),
+            "files": pipeline.fingerprint_files(args.dataset_path, ".h5"),
+        }),
+        pipeline.Stage("encode", stage_encode, ("ingest",), {"n_bins": args.n_bins}),
+        pipeline.Stage("matrices", stage_matrices, ("ingest", "encode"), {}),
+        pipeline.Stage("train", functools.partial(stage_train, **run_time),
+                       ("encode", "matrices"), training_config),
+        pipeline.Stage("evaluate",
+                       functools.partial(stage_evaluate, check=args.check_evaluation, **run_time),
+                       ("encode", "matrices", "train"),
+                       {"k": args.k, "valid_fraction": args.valid_fraction, "seed": args.seed}),
+        # writes the API artifacts every time it runs, so it is never served from the cache
+        pipeline.Stage("export", stage_export, ("ingest", "encode", "matrices", "train"),
+                       {"output_dir": args.output_dir, "neighbors_k": args.neighbors_k}, cache=False),
+    ]
 
 # %%
-print('saved model')
+def main():
+    parser = argparse.ArgumentParser(description="Train the LightFM track recommender")
+    parser.add_argument("--dataset-path", default=DATASET_PATH,
+                        help="MSD root directory or a summary .h5 file")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--epochs", type=int, default=MAX_EPOCHS,
+                        help="maximum number of epochs (exact count when --valid-fraction is 0)")
+    parser.add_argument("--num-threads", type=int, default=NUM_THREADS)
+    parser.add_argument("--valid-fraction", type=float, default=0.2,
+                        help="share of interactions held out for early stopping")
+    parser.add_argument("--patience", type=int, default=PATIENCE,
+                        help="epochs without improvement before stopping")
+    parser.add_argument("--loss", choices=["bpr", "warp", "warp-kos", "logistic"],
+                        default=DEFAULT_MODEL_PARAMS["loss"])
+    parser.add_argument("--no-components", type=int, default=DEFAULT_MODEL_PARAMS["no_components"],
+                        help="embedding dimensionality")
+    parser.add_argument("--learning-rate", type=float, default=0.05)
+    parser.add_argument("--alpha", type=float, default=0.0,
+                        help="L2 penalty on user and item features")
+    parser.add_argument("--no-refit", action="store_true",
+                        help="export the early-stopping model instead of refitting it on all "
+                             "interactions for the best epoch count")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--k", type=int, default=5, help="cutoff for precision/recall/coverage")
+    parser.add_argument("--n-bins", type=int, default=features.DEFAULT_N_BINS,
+                        help="quantile bins per continuous audio feature")
+    parser.add_argument("--neighbors-k", type=int, default=NEIGHBORS_K,
+                        help="similar tracks kept per track for /similar (0 to skip)")
+    parser.add_argument("--stage", choices=STAGES, default="export",
+                        help="run the pipeline up to and including this stage")
+    parser.add_argument("--force", action="append", default=[], choices=STAGES + ("all",),
+                        help="recompute this stage and everything after it (repeatable)")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--no-cache", action="store_true", help="run every stage without the cache")
+    parser.add_argument("--report", metavar="PATH",
+                        help="write a JSON report of per-stage time, CPU, RSS and allocations")
+    parser.add_argument("--no-tracemalloc", action="store_true",
+                        help="skip allocation tracing in the report (it slows Python-heavy stages)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="add new tracks from --dataset-path to the model in --output-dir")
+    parser.add_argument("--incremental-epochs", type=int, default=INCREMENTAL_EPOCHS)
+    parser.add_argument("--check-evaluation", action="store_true",
+                        help="also compare the vectorized metrics with lightfm.evaluation")
+    parser.add_argument("--compare-encodings", action="store_true",
+                        help="benchmark the binned encoding against the raw-valued one and exit")
+    args = parser.parse_args()
+
+    stages = build_stages(args)
+    cache = None if args.no_cache else pipeline.StageCache(args.cache_dir)
+
+    if args.compare_encodings or args.incremental:
+        df_tracks = pipeline.run(stages, cache, until="ingest", force=args.force)["ingest"]
+        if args.compare_encodings:
+            compare_encodings(df_tracks, epochs=args.epochs, k=args.k, num_threads=args.num_threads)
+        else:
+            incremental_update(df_tracks, args.output_dir, epochs=args.incremental_epochs,
+                               num_threads=args.num_threads)
+        return
+
+    report = profiling.RunReport(trace_allocations=not args.no_tracemalloc) if args.report else None
+    outputs = pipeline.run(stages, cache, until=args.stage, force=args.force, report=report)
+
+    if report is not None:
+        report.add(**run_summary(outputs))
+        report.write(args.report)
+
+    if "export" in outputs:
+        interactions = outputs["matrices"]["interactions"]
+        item_features = outputs["encode"]["item_features"]
+        # Add some debugging info
+        print(f"\nFinal verification:")
+        print(f"Model trained with {interactions.shape[0]} users and {interactions.shape[1]} items")
+        print(f"Item feature matrix: {item_features.shape}, nnz={item_features.nnz}")
+
 
-# Add some debugging info
-print(f"\nFinal verification:")
-print(f"Model trained with {interactions.shape[0]} users and {interactions.shape[1]} items")
-print(f"Sample features that should exist: {item_features_list[0][1]}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
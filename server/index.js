@@ -7,6 +7,10 @@ const session = require('express-session');
 
 dotenv.config();
 
+const recommendationCache = require('./utils/recommendationCache');
+const recommendationHistory = require('./utils/recommendationHistory');
+const tracing = require('./utils/tracing');
+
 const app = express();
 const PORT = process.env.PORT || 8080;
 const MONGO_URI = process.env.MONGO_URI;
@@ -43,6 +47,9 @@ const getCorsOrigin = () => {
   return origins.filter(Boolean);
 };
 
+// Request id + per-stage timings (Server-Timing header, optional TRACE_LOG_FILE)
+app.use(tracing.middleware);
+
 app.use(cors({
   origin: function (origin, callback) {
     // Allow requests with no origin (mobile apps, curl, etc.)
@@ -83,7 +90,8 @@ app.use(cors({
   },
   credentials: true,
   methods: ['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
-  allowedHeaders: ['Content-Type', 'Authorization'],
+  allowedHeaders: ['Content-Type', 'Authorization', 'X-Request-Id'],
+  exposedHeaders: ['Server-Timing', 'X-Request-Id'],
 }));
 app.use(express.json());
 
@@ -172,6 +180,9 @@ mongoose
   .connect(MONGO_URI, { dbName: DB_NAME })
   .then(() => {
     console.log('✅ Connected to MongoDB');
+    recommendationCache.backfillExpiry()
+      .then(count => count && console.log(`🗓️ Set expiresAt on ${count} older cached recommendations`))
+      .catch(err => console.warn('⚠️ Failed to backfill recommendation expiry:', err.message));
     app.listen(PORT, '0.0.0.0', () => {
       console.log(`🚀 Server listening on http://0.0.0.0:${PORT}`);
       console.log(`🌐 Environment: ${process.env.NODE_ENV || 'development'}`);
@@ -196,12 +207,16 @@ mongoose
 //   process.exit(1);
 // };
 
-// Graceful shutdown
-process.on('SIGINT', async () => {
+// Graceful shutdown: write out buffered history and access times first
+const shutdown = async () => {
   console.log('\n🛑 Shutting down...');
   try {
+    await recommendationHistory.flush();
+    await recommendationCache.flushAccessTimes();
     await mongoose.connection.close();
   } finally {
     process.exit(0);
   }
-});
+};
+process.on('SIGINT', shutdown);
+process.on('SIGTERM', shutdown);
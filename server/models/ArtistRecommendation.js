@@ -5,7 +5,9 @@ const ArtistRecommendationSchema = new Schema(
     artistId: { type: String, required: true, unique: true },
     artistName: { type: String, required: true },
     recommendations: { type: [String], required: true },
+    modelVersion: { type: String, default: null }, // ML model that produced the list
     cachedAt: { type: Date, default: Date.now },
+    expiresAt: { type: Date },
     lastAccessed: { type: Date, default: Date.now },
   },
   { timestamps: true }
@@ -14,7 +16,14 @@ const ArtistRecommendationSchema = new Schema(
 // Index for fast lookups by artistId
 ArtistRecommendationSchema.index({ artistId: 1 });
 
+// Index for lookups by artistName (the recommendation cache queries with $in)
+ArtistRecommendationSchema.index({ artistName: 1 });
+
 // Index for cleanup of old cache entries
 ArtistRecommendationSchema.index({ cachedAt: 1 });
 
+// TTL index: Mongo deletes each entry once its expiresAt has passed (entries
+// written before the field existed get one from recommendationCache.backfillExpiry)
+ArtistRecommendationSchema.index({ expiresAt: 1 }, { expireAfterSeconds: 0 });
+
 module.exports = model('ArtistRecommendation', ArtistRecommendationSchema);
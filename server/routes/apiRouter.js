@@ -2,7 +2,16 @@ const axios = require('axios');
 const express = require('express');
 const Recommendation = require('../models/Recommendation');
 const ArtistRecommendation = require('../models/ArtistRecommendation');
-const { fetchRecommendations, getCuratedRecommendations, getArtistRecommendations } = require('../utils/fetchRecommendations');
+const mlClient = require('../utils/mlClient');
+const { getCatalogue } = require('../utils/artistCatalogue');
+const recommendationCache = require('../utils/recommendationCache');
+const recommendationHistory = require('../utils/recommendationHistory');
+const topArtistsCache = require('../utils/topArtistsCache');
+const spotifyClient = require('../utils/spotifyClient');
+const prewarmQueue = require('../utils/prewarmQueue');
+const {
+  fetchRecommendations, getCuratedRecommendations, getArtistRecommendations, lookupArtistRecommendations,
+} = require('../utils/fetchRecommendations');
 
 const router = express.Router();
 
@@ -21,70 +30,9 @@ router.get('/top_artists', async (req, res) => {
     return res.status(401).json({ error: 'No access token - please authenticate with Spotify first' });
   }
   
-  const url = "https://api.spotify.com/v1/me/top/artists?limit=10"
-  
-  const payload = {
-    headers: {
-      Authorization: `Bearer ${access_token}`,
-    }
-  };
-  
   try {
-    const result = await axios.get(url, payload);
-    
-    if (result.error) {
-      console.error("Spotify GET request failed")
-    }
-    const data = result.data;
-    
-    // Extract artist names for recommendation system
-    const artistNames = data.items.map(artist => artist.name);
-    const artistIds = data.items.map(artist => artist.id);
-    const artistImagesURLs= data.items.map(artist => {
-      if (!artist.images || artist.images.length == 0) {
-        return `data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAALcAAAETCAMAAABDSmf
-hAAAAMFBMVEXd3d3////a2trf39/6+vrl5eXv7+/4+Pjn5+fy8vLe3t7m5ubi4uLs7Oz5+f
-n09PQCwX1aAAAFbUlEQVR4nO2c2ZKrMBBDEzNZJ0z+/29vnI0lQAxIcrtunweeVS65F2P3Z
-uM4juM4juM4juM4juM4juM4juM4juM4juM4juM4aYTcAuYRQrjs6rreX/e376UKJegP1fH0
-s+3yt9/Z1h6qfV/zi8PRrm3qMdEPrjuDysNmPyn6zk9tTnmC6jt1bqFtQp2oOnK0subhMu3
-rD7dcTCgPp1mqI9fcmuNiz1Yd+c285LOc3VnyrMLDdaHsm8urfLLP8zZkj2xeOa9RfWOfR/
-iyHdkmi8nXy76ZvEzZGYSv9XYm4SjZYuFhVQDMJjwccLJvwlVRJaQW24mowuEOK1uVgCq07
-FsvIZAd/vC6t/wia3HlOgl/bxJcEmHvTYpLImSLU1xy50zVTZO9PRCdsqIv+w7RKaRN+YQm
-G1uXfHBiOQXTK4xDyj7k5aZtTfZyb7c7hmz6cpPSPTeYPCAsODV2v2AsuEA2Y8F5lUkbeEh
-BtvBToGM4Pwg+2GNlL/gbshCsUYJKNnhnws8eRoF2bDqbYMtZnU2w/YMqmkSQRtEknSc43Y
-JSsAUuoijtjbwzobQ3skaR2htncEnp3eKC0s06FBwBZnCtbNhBinZb4ro18baEbUy5bkzTo
-w4nqICizfIRTEmoaokbMIFQW51EMM2xXjcmgOt1Yyorddr533UfXbdU92+hun29tbpLjSe4
-y4KplJovS61PSq0HQbrlfUOp/Q7opxr4Xul3Cu3nUecn6oSJOq9SJx7U+aC6oUf9cFAHFNg
-VSG1AwV1C0f0tjgDv40l14368an84wGRrDY68Y6U0OPLmjLKURf1Nu+sW3uOAXvjRGQV7K1
-lnFKRNNsKIAr5AqLgdGwHfw5PVVvC765rmAX91XVOE/6Jla45lGfeoFQtOGesicDjlYQY/p
-JCm6NBjOOnhEbu6or1Q41YpxEev1LIQXFG1YTqF+QCTGcS5b7ppP9fIM9A479AFL9FJFidu
-ypdwhsUVIyIIaVMzSwS/N7mP518EdCmumMdxF47t7nUDuKBXT6mJsi8cd7IsHgVVqGxUNNS
-POoPUtLTZCuMgomGWGYTro2GmmY9rG3zKWIUkVoXxDN5+ss4p2ebfrizFD3WVRfm6caZ3/v
-TTklFFoVZ5qGCHhdI5z9BCVjXOHN43SCrZufO+k6BnznDmvFYj507Wsc9NOHM+G8MifOHoQ
-aZ94STZFfu2Eke44A89Q7jkdQZceBDd7QULh2dIjXCdbGg4VMpGFrbiB1Oo8lD+zgtzPqt/
-5oURrpeNEK5/vHNn7eYkl1I04fq3ri9WJSDVbcchVvyJ1U+0aLNctnzwSYfFP2P1D6K7LJ0
-wl1n2woyfKXJ3WLI384XAFvNlZyhLBpht8cyx5M3cKwe5Y8mbeSeH+rfnY/zNcUq2cmqAOc
-EwZ13yQbpTLITuhvRTfe070a+kxpS8ZeAAibpNZMo2ae2mnRj4Jmlrysckficl3Rtc7qTC0
-OByp8RCk8ud0N6bXO7vzabR5f664OZi94vputBcqmyYXHAz7cInUyHFViHYYyKGm6q7+4wn
-TeVYggWMr3duZdOMvlE3mnPejBjFcBB8MPLaWz/YcSbDodD4rowMvvMxW5o0DD6cNtbFDzF
-UFVo5yZxkIGcWYJPBEG62gu3wYZQibDJklNyK0vgwShk2+YgohdjkwyhFRJNIL/UYbtC69G
-oUQz9GvtC1ifUStqHT15tuLLucCoyCkXYkLCYKRsq0d+c3VUH27qR66418hyaCF9BZtglF2
-rtdouRWMo93iVJAR9zm/TC5qG3ZZJ6isk4kFLktm42ZW8dcniWh+fPMPnVxxeCDZ0ApLJy8
-/mWa/ok2yCMQFtPKN5z/AZpDb7mUEOhpAAAAAElFTkSuQmCC`
-      }
-
-      return artist.images[0].url
-    })
-    
-    console.log(`📊 Retrieved ${artistNames.length} top artists:`, artistNames);
-    console.log(`📊 Retrieved ${artistImagesURLs.length} artist Images`, artistImagesURLs);
-    
-    res.json({
-      artists: data.items,
-      artistNames: artistNames,
-      artistIds: artistIds,
-      artistImageURLs: artistImagesURLs,
-    });
+    // Trimmed payload, cached per session and revalidated with If-None-Match
+    res.json(await topArtistsCache.getTopArtists(req.sessionID, access_token));
   } catch (e) {
     console.error("❌ Spotify GET request failed:", e.message);
     console.error("❌ Error details:", {
@@ -106,7 +54,14 @@ rtdouRWMo93iVJAR9zm/TC5qG3ZZJ6isk4kFLktm42ZW8dcniWh+fPMPnVxxeCDZ0ApLJy8
     }
     
     // Handle different error types
-    if (e.response) {
+    if (e.code === 'SPOTIFY_QUEUE_FULL') {
+      // Too many requests already waiting on our own Spotify rate limit
+      res.set('Retry-After', String(Math.ceil(e.retryAfterMs / 1000)));
+      return res.status(429).json({
+        error: "Too many requests to Spotify right now. Please try again shortly.",
+        code: "RATE_LIMITED"
+      });
+    } else if (e.response) {
       // Spotify API returned an error
       const status = e.response.status;
       const errorData = e.response.data;
@@ -136,6 +91,9 @@ rtdouRWMo93iVJAR9zm/TC5qG3ZZJ6isk4kFLktm42ZW8dcniWh+fPMPnVxxeCDZ0ApLJy8
         });
       } else if (status === 429) {
         console.error("❌ 429 Rate limited by Spotify");
+        if (e.response.headers?.['retry-after']) {
+          res.set('Retry-After', e.response.headers['retry-after']);
+        }
         return res.status(429).json({ 
           error: "Rate limited by Spotify. Please try again later.",
           code: "RATE_LIMITED"
@@ -166,6 +124,11 @@ rtdouRWMo93iVJAR9zm/TC5qG3ZZJ6isk4kFLktm42ZW8dcniWh+fPMPnVxxeCDZ0ApLJy8
   }
 });
 
+// Spotify client pacing, top-artists cache and login prewarm counters
+router.get('/spotify/stats', (req, res) => {
+  res.json({ client: spotifyClient.stats(), topArtists: topArtistsCache.stats(), prewarm: prewarmQueue.stats() });
+});
+
 router.get('/recs_from_top_artists', async (req, res) => {
   const url = 'http://[::]:8080/api/top_artists';
   
@@ -185,15 +148,12 @@ router.post('/check_artists_availability', async (req, res) => {
   }
 
   try {
-    const base = process.env.ML_SERVICE_URL;
-    if (!base) {
+    if (!mlClient.isConfigured()) {
       return res.status(503).json({ error: 'ML service not configured' });
     }
 
-    // Get available artists from ML service
-    const url = `${base.replace(/\/$/, '')}/artists`;
-    const { data } = await axios.get(url, { timeout: 5000 });
-    const availableArtists = new Set(data.artists);
+    // Available artists from the cached ML catalogue
+    const { set: availableArtists } = await getCatalogue();
 
     // Check availability of each Spotify artist
     const availabilityResults = artistNames.map((artistName, index) => ({
@@ -210,31 +170,17 @@ router.post('/check_artists_availability', async (req, res) => {
     if (availableArtistsList.length >= 5) {
       console.log(`✅ Auto-generating recommendations with ${availableArtistsList.length} available artists`);
       
-      // Generate recommendations immediately
-      const recommendations = [];
+      // Per-artist recommendations from the cache (warmed at login), misses from the ML model in parallel
       const artistNamesForRecs = availableArtistsList.map(a => a.artistName);
-      
-      for (const artistName of artistNamesForRecs) {
-        try {
-          const predictUrl = `${base.replace(/\/$/, '')}/predict`;
-          const { data: artistData } = await axios.get(predictUrl, { 
-            params: { user_id: artistName },
-            timeout: 10000 
-          });
-          
-          if (artistData && Array.isArray(artistData.top_items)) {
-            recommendations.push(...artistData.top_items.slice(0, 1)); // Take 1 from each to get variety
-          }
-        } catch (err) {
-          console.warn(`⚠️ Failed to get recommendations for ${artistName}:`, err.message);
-        }
-      }
+      const topItems = await lookupArtistRecommendations(artistNamesForRecs);
+      // Take 1 from each to get variety
+      const recommendations = artistNamesForRecs.flatMap(name => (topItems.get(name) || []).slice(0, 1));
 
       // Remove duplicates and limit to 5 recommendations
       const uniqueRecommendations = [...new Set(recommendations)].slice(0, 5);
       
-      // Save to database
-      const doc = await Recommendation.create({ 
+      // Save to database (written behind the response)
+      const doc = await recommendationHistory.record({
         userId: userId || 'auto_user',
         likedTracks: artistNamesForRecs,
         recommendations: uniqueRecommendations
@@ -291,14 +237,11 @@ router.post('/recommend', async (req, res) => {
     console.log(`🎯 Generating manual recommendations for user ${userId} with ${artistNames.length} artists`);
     
     // Single validation point - ensure all artists exist in dataset
-    const baseUrl = process.env.ML_SERVICE_URL;
-    if (!baseUrl) {
+    if (!mlClient.isConfigured()) {
       return res.status(503).json({ error: 'ML service not configured' });
     }
 
-    const url = `${baseUrl.replace(/\/$/, '')}/artists`;
-    const { data } = await axios.get(url, { timeout: 5000 });
-    const availableArtists = new Set(data.artists);
+    const { set: availableArtists } = await getCatalogue();
 
     const unavailableArtists = artistNames.filter(artist => !availableArtists.has(artist));
     if (unavailableArtists.length > 0) {
@@ -309,32 +252,18 @@ router.post('/recommend', async (req, res) => {
       });
     }
 
-    // Generate recommendations using the ML model
-    const recommendations = [];
-    
+    // Per-artist recommendations from the cache, misses from the ML model in parallel
+    const topItems = await lookupArtistRecommendations(artistNames);
+
     // Get top 2 tracks from each artist for variety
-    for (const artistName of artistNames) {
-      try {
-        const predictUrl = `${baseUrl.replace(/\/$/, '')}/predict`;
-        const { data: artistData } = await axios.get(predictUrl, { 
-          params: { user_id: artistName },
-          timeout: 10000 
-        });
-        
-        if (artistData && Array.isArray(artistData.top_items)) {
-          recommendations.push(...artistData.top_items.slice(0, 2));
-        }
-      } catch (err) {
-        console.warn(`⚠️ Failed to get recommendations for ${artistName}:`, err.message);
-      }
-    }
+    const recommendations = artistNames.flatMap(name => (topItems.get(name) || []).slice(0, 2));
 
     // Remove duplicates and limit to 5 recommendations
     const uniqueRecommendations = [...new Set(recommendations)].slice(0, 5);
     
-    // Save to database
-    const doc = await Recommendation.create({ 
-      userId, 
+    // Save to database (written behind the response)
+    const doc = await recommendationHistory.record({
+      userId,
       likedTracks: artistNames,
       recommendations: uniqueRecommendations
     });
@@ -382,17 +311,15 @@ router.get('/artists/search', async (req, res) => {
   }
 
   try {
-    const base = process.env.ML_SERVICE_URL;
-    if (!base) {
+    if (!mlClient.isConfigured()) {
       return res.status(503).json({ error: 'ML service not configured' });
     }
 
-    const url = `${base.replace(/\/$/, '')}/artists`;
-    const { data } = await axios.get(url, { timeout: 5000 });
+    const { artists } = await getCatalogue();
     
     // Filter artists based on query (case-insensitive)
     const searchQuery = query.toLowerCase();
-    const matchingArtists = data.artists
+    const matchingArtists = artists
       .filter(artist => artist.toLowerCase().includes(searchQuery))
       .slice(0, parseInt(limit))
       .map(artist => ({
@@ -406,7 +333,7 @@ router.get('/artists/search', async (req, res) => {
       query,
       results: matchingArtists,
       count: matchingArtists.length,
-      totalAvailable: data.artists.length
+      totalAvailable: artists.length
     });
   } catch (err) {
     console.error('❌ Failed to search artists:', err.message);
@@ -417,17 +344,15 @@ router.get('/artists/search', async (req, res) => {
 // Get all available artists (for debugging/admin purposes)
 router.get('/artists/available', async (req, res) => {
   try {
-    const base = process.env.ML_SERVICE_URL;
-    if (!base) {
+    if (!mlClient.isConfigured()) {
       return res.status(503).json({ error: 'ML service not configured' });
     }
 
-    const url = `${base.replace(/\/$/, '')}/artists`;
-    const { data } = await axios.get(url, { timeout: 5000 });
+    const { artists } = await getCatalogue();
     
     res.json({
-      availableArtists: data.artists,
-      count: data.artists.length
+      availableArtists: artists,
+      count: artists.length
     });
   } catch (err) {
     console.error('❌ Failed to fetch available artists:', err.message);
@@ -448,6 +373,15 @@ router.get('/artists/cached', async (req, res) => {
   }
 });
 
+router.get('/artists/cache/stats', async (req, res) => {
+  try {
+    res.json(await recommendationCache.stats());
+  } catch (err) {
+    console.error('❌ Failed to compute cache stats:', err.message);
+    res.status(500).json({ error: 'Failed to compute cache stats' });
+  }
+});
+
 router.post('/artists/cache/:artistName', async (req, res) => {
   const { artistName } = req.params;
   
@@ -476,6 +410,7 @@ router.delete('/artists/cache/:artistName', async (req, res) => {
   
   try {
     const result = await ArtistRecommendation.deleteOne({ artistName });
+    recommendationCache.evict(artistName);
     
     if (result.deletedCount === 0) {
       return res.status(404).json({ error: `No cached recommendations found for ${artistName}` });
@@ -494,6 +429,7 @@ router.delete('/artists/cache/:artistName', async (req, res) => {
 router.delete('/artists/cache', async (req, res) => {
   try {
     const result = await ArtistRecommendation.deleteMany({});
+    recommendationCache.clear();
     
     res.json({
       message: 'Successfully cleared all cached artist recommendations',
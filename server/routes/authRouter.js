@@ -1,6 +1,7 @@
-const axios = require("axios");
 const express = require("express");
 const pkce = require("../utils/pkce");
+const spotifyClient = require("../utils/spotifyClient");
+const prewarmQueue = require("../utils/prewarmQueue");
 const dotenv = require("dotenv");
 
 dotenv.config();
@@ -279,7 +280,7 @@ router.get('/spotify/callback', async (req, res) => {
   console.log(`🔗 Callback - Using redirect URI: "${redirectUri}"`);
   console.log(`⚠️ This MUST match EXACTLY what was sent to Spotify in the initial auth request!`);
   
-  const url = "https://accounts.spotify.com/api/token";
+  const url = spotifyClient.accountsUrl("/api/token");
   const payload = new URLSearchParams({
     client_id: CLIENT_ID,
     grant_type: 'authorization_code',
@@ -298,7 +299,7 @@ router.get('/spotify/callback', async (req, res) => {
   
   // https://www.oauth.com/oauth2-servers/access-tokens/access-token-response/
   try {
-    const tokenRes = await axios.post(url, payload, opts);
+    const tokenRes = await spotifyClient.request("post", url, { data: payload, headers: opts.headers });
     const tokenData = tokenRes.data;
 
     if (tokenData.error) {
@@ -360,9 +361,17 @@ router.get('/spotify/callback', async (req, res) => {
         return res.status(500).send("Couldn't save session");
       }
       res.redirect(redirectUrl.toString());
+      // Warm top artists and recommendations while the browser follows the redirect
+      prewarmQueue.enqueue(req.sessionID, req.session.access_token);
     });
 
   } catch(e) {
+    if (e.code === 'SPOTIFY_QUEUE_FULL') {
+      // Too many logins already waiting on our own Spotify accounts rate limit
+      console.warn("⚠️ Spotify token exchange turned away, accounts queue is full");
+      res.set('Retry-After', String(Math.ceil(e.retryAfterMs / 1000)));
+      return res.status(429).send("Too many logins right now. Please try again shortly.");
+    }
     console.error("Spotify callback handler error:", e.response || e.message);
     return res.status(500).send("Internal error during Spotify OAuth callback");
   }
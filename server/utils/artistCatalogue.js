@@ -0,0 +1,66 @@
+const mlClient = require('./mlClient');
+
+const ARTIST_CATALOGUE_TTL_MS = Number(process.env.ARTIST_CATALOGUE_TTL_MS) || 5 * 60 * 1000;
+
+/**
+ * Process-wide copy of the ML service's GET /artists list and its Set.
+ *
+ * Only the very first caller waits for the download. After that, callers get
+ * the cached copy immediately; once it is older than the TTL (or the ML
+ * model version changes) one background refresh revalidates it with
+ * If-None-Match, so an unchanged list costs a 304 and no body.
+ */
+const catalogue = {
+  artists: null,
+  set: null,
+  etag: null,
+  fetchedAt: 0,
+};
+let refreshing = null;
+
+function refresh() {
+  // single flight: concurrent callers share the request already in progress
+  if (!refreshing) {
+    refreshing = (async () => {
+      const response = await mlClient.request('get', '/artists', {
+        timeout: 5000,
+        headers: catalogue.etag ? { 'If-None-Match': catalogue.etag } : undefined,
+        validateStatus: status => status === 200 || status === 304,
+      });
+      if (response.status === 200) {
+        catalogue.artists = response.data.artists;
+        catalogue.set = new Set(catalogue.artists);
+        catalogue.etag = response.headers.etag || null;
+        console.log(`📚 Loaded artist catalogue (${catalogue.artists.length} artists)`);
+      }
+      catalogue.fetchedAt = Date.now();
+    })().finally(() => {
+      refreshing = null;
+    });
+  }
+  return refreshing;
+}
+
+function refreshInBackground() {
+  refresh().catch(err => console.warn('⚠️ Artist catalogue refresh failed, serving cached copy:', err.message));
+}
+
+/**
+ * { artists, set } for the current catalogue. Stale copies are served while a
+ * refresh runs in the background.
+ */
+async function getCatalogue() {
+  if (!catalogue.artists) {
+    await refresh();
+  } else if (Date.now() - catalogue.fetchedAt > ARTIST_CATALOGUE_TTL_MS) {
+    refreshInBackground();
+  }
+  return { artists: catalogue.artists, set: catalogue.set };
+}
+
+// a redeployed model may know different artists: revalidate straight away
+mlClient.onModelVersionChange(() => {
+  if (catalogue.artists) refreshInBackground();
+});
+
+module.exports = { getCatalogue };
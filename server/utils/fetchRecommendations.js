@@ -1,54 +1,57 @@
-const axios = require('axios');
-const ArtistRecommendation = require('../models/ArtistRecommendation');
 const { getCuratedRecommendations } = require('./recommendationCuration');
+const mlClient = require('./mlClient');
+const recommendationCache = require('./recommendationCache');
+
+const mockRecommendations = (artistName) =>
+  [`mock_rec_1_${artistName}`, `mock_rec_2_${artistName}`, `mock_rec_3_${artistName}`, `mock_rec_4_${artistName}`, `mock_rec_5_${artistName}`];
 
 /**
- * Get recommendations for a single artist (with caching)
+ * Recommendations for many artists (with caching): Map artistName ->
+ * recommendations. Cache misses cost one Mongo query in total; artists
+ * missing from both cache tiers are fetched from the ML API in parallel and
+ * cached together. Artists the ML service can't answer for are left out.
  */
-async function getArtistRecommendations(artistName) {
+async function lookupArtistRecommendations(artistNames) {
   // Check cache first
-  let cached = await ArtistRecommendation.findOne({ artistName });
-  
-  if (cached) {
-    // Update last accessed time
-    cached.lastAccessed = new Date();
-    await cached.save();
-    console.log(`✅ Found cached recommendations for artist: ${artistName}`);
-    return cached.recommendations;
-  }
-
-  // Fetch from ML API
-  const base = process.env.ML_SERVICE_URL;
-  if (!base) {
-    console.warn(`⚠️ No ML_SERVICE_URL set, using mock for artist: ${artistName}`);
-    return [`mock_rec_1_${artistName}`, `mock_rec_2_${artistName}`, `mock_rec_3_${artistName}`, `mock_rec_4_${artistName}`, `mock_rec_5_${artistName}`];
+  const found = await recommendationCache.getMany(artistNames);
+  const missing = [...new Set(artistNames)].filter(artistName => !found.has(artistName));
+  if (found.size > 0) {
+    console.log(`✅ Found cached recommendations for ${found.size}/${new Set(artistNames).size} artists`);
   }
 
-  try {
-    const url = `${base.replace(/\/$/, '')}/predict`;
-    const { data } = await axios.get(url, { 
-      params: { user_id: artistName },
-      timeout: 10000 
-    });
-
-    if (!data || !Array.isArray(data.top_items)) {
-      throw new Error('Invalid ML response format');
+  if (missing.length > 0) {
+    // Fetch from ML API
+    if (!mlClient.isConfigured()) {
+      console.warn(`⚠️ No ML_SERVICE_URL set, cannot fetch recommendations for artists: ${missing.join(', ')}`);
+    } else {
+      const fetched = await mlClient.predictMany(missing);
+      try {
+        await recommendationCache.putMany(fetched);
+        console.log(`✅ Fetched and cached recommendations for ${fetched.size} artists`);
+      } catch (err) {
+        console.warn('⚠️ Failed to cache fetched recommendations:', err.message);
+      }
+      fetched.forEach((recommendations, artistName) => found.set(artistName, recommendations));
     }
+  }
+  return found;
+}
 
-    // Cache the results
-    await ArtistRecommendation.create({
-      artistId: artistName, // Using artist name as ID for now
-      artistName,
-      recommendations: data.top_items
-    });
+/**
+ * Get recommendations for many artists (with caching), in input order.
+ */
+async function getManyArtistRecommendations(artistNames) {
+  const found = await lookupArtistRecommendations(artistNames);
+  // Return mock data as fallback
+  return artistNames.map(artistName => found.get(artistName) || mockRecommendations(artistName));
+}
 
-    console.log(`✅ Fetched and cached recommendations for artist: ${artistName}`);
-    return data.top_items;
-  } catch (err) {
-    console.warn(`⚠️ Failed to fetch recommendations for artist ${artistName}:`, err.message);
-    // Return mock data as fallback
-    return [`mock_rec_1_${artistName}`, `mock_rec_2_${artistName}`, `mock_rec_3_${artistName}`, `mock_rec_4_${artistName}`, `mock_rec_5_${artistName}`];
-  }
+/**
+ * Get recommendations for a single artist (with caching)
+ */
+async function getArtistRecommendations(artistName) {
+  const [recommendations] = await getManyArtistRecommendations([artistName]);
+  return recommendations;
 }
 
 /**
@@ -61,10 +64,7 @@ async function getCuratedRecommendationsFromArtists(artistNames, targetCount = 5
 
   console.log(`🎯 Getting curated recommendations for ${artistNames.length} artists:`, artistNames);
 
-  // Get recommendations for each artist in parallel
-  const artistRecs = await Promise.all(
-    artistNames.map(artist => getArtistRecommendations(artist))
-  );
+  const artistRecs = await getManyArtistRecommendations(artistNames);
 
   const curatedRecs = await getCuratedRecommendations(artistRecs, targetCount);
 
@@ -78,14 +78,12 @@ async function getCuratedRecommendationsFromArtists(artistNames, targetCount = 5
 async function fetchRecommendations(userId, likedTracks) {
   console.warn('⚠️ Using legacy fetchRecommendations - consider using getCuratedRecommendations instead');
   
-  const base = process.env.ML_SERVICE_URL;
-  if (!base) {
+  if (!mlClient.isConfigured()) {
     return likedTracks.map((t, i) => `mock_rec_${i}_${t}`);
   }
 
   try {
-    const url = `${base.replace(/\/$/, '')}/predict`;
-    const { data } = await axios.post(url, { userId, likedTracks }, { timeout: 5000 });
+    const { data } = await mlClient.request('post', '/predict', { data: { userId, likedTracks }, timeout: 5000 });
     if (!data || !Array.isArray(data.recommendations)) {
       throw new Error('Invalid ML response');
     }
@@ -99,5 +97,7 @@ async function fetchRecommendations(userId, likedTracks) {
 module.exports = {
   fetchRecommendations, // Legacy
   getArtistRecommendations,
+  getManyArtistRecommendations,
+  lookupArtistRecommendations,
   getCuratedRecommendations: getCuratedRecommendationsFromArtists
 };
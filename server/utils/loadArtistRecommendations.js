@@ -0,0 +1,101 @@
+/**
+ * Bulk-load the NDJSON written by ml_training/bulk_score.py into the
+ * ArtistRecommendation cache, so the first request for every artist is a hit.
+ *
+ * Usage: node utils/loadArtistRecommendations.js <artist_recommendations.ndjson> [batchSize]
+ */
+const fs = require('fs');
+const readline = require('readline');
+const dotenv = require('dotenv');
+const mongoose = require('mongoose');
+const ArtistRecommendation = require('../models/ArtistRecommendation');
+
+const DEFAULT_BATCH_SIZE = 1000;
+const DEFAULT_TTL_MS = 7 * 24 * 60 * 60 * 1000;
+
+function toUpsert(doc, now, expiresAt) {
+  return {
+    updateOne: {
+      filter: { artistId: doc.artistId },
+      update: {
+        $set: {
+          artistName: doc.artistName || doc.artistId,
+          recommendations: doc.recommendations,
+          modelVersion: doc.modelVersion || null,
+          cachedAt: now,
+          expiresAt,
+        },
+        $setOnInsert: { lastAccessed: now },
+      },
+      upsert: true,
+    },
+  };
+}
+
+/**
+ * Stream the file line by line and upsert it in unordered bulkWrite batches.
+ * Returns { read, upserted, modified, skipped }.
+ */
+async function loadArtistRecommendations(filePath, batchSize = DEFAULT_BATCH_SIZE) {
+  const lines = readline.createInterface({ input: fs.createReadStream(filePath), crlfDelay: Infinity });
+  const stats = { read: 0, upserted: 0, modified: 0, skipped: 0 };
+  const now = new Date();
+  // read here rather than at load time: the CLI only runs dotenv.config() after requiring this module
+  const ttlMs = Number(process.env.REC_CACHE_TTL_MS) || DEFAULT_TTL_MS;
+  const expiresAt = new Date(now.getTime() + ttlMs);
+  let batch = [];
+
+  const flush = async () => {
+    if (batch.length === 0) return;
+    const result = await ArtistRecommendation.bulkWrite(batch, { ordered: false });
+    stats.upserted += result.upsertedCount;
+    stats.modified += result.modifiedCount;
+    batch = [];
+    console.log(`📦 ${stats.read} artists loaded`);
+  };
+
+  for await (const line of lines) {
+    if (!line.trim()) continue;
+    let doc;
+    try {
+      doc = JSON.parse(line);
+    } catch (err) {
+      stats.skipped++;
+      continue;
+    }
+    if (!doc.artistId || !Array.isArray(doc.recommendations)) {
+      stats.skipped++;
+      continue;
+    }
+    stats.read++;
+    batch.push(toUpsert(doc, now, expiresAt));
+    if (batch.length >= batchSize) await flush();
+  }
+  await flush();
+  return stats;
+}
+
+if (require.main === module) {
+  dotenv.config();
+  const [filePath, batchSize] = process.argv.slice(2);
+  if (!filePath || !process.env.MONGO_URI) {
+    console.error('Usage: MONGO_URI=... node utils/loadArtistRecommendations.js <file.ndjson> [batchSize]');
+    process.exit(1);
+  }
+
+  (async () => {
+    await mongoose.connect(process.env.MONGO_URI, { dbName: process.env.MONGO_DB || undefined });
+    try {
+      const start = Date.now();
+      const stats = await loadArtistRecommendations(filePath, Number(batchSize) || DEFAULT_BATCH_SIZE);
+      console.log(`✅ Loaded ${stats.read} artists in ${((Date.now() - start) / 1000).toFixed(1)}s`, stats);
+    } finally {
+      await mongoose.connection.close();
+    }
+  })().catch(err => {
+    console.error('❌ Bulk load failed:', err.message);
+    process.exit(1);
+  });
+}
+
+module.exports = { loadArtistRecommendations };
@@ -0,0 +1,205 @@
+const http = require('http');
+const https = require('https');
+const { performance } = require('perf_hooks');
+const axios = require('axios');
+const tracing = require('./tracing');
+
+const ML_TIMEOUT_MS = Number(process.env.ML_TIMEOUT_MS) || 10000;
+const ML_CONCURRENCY = Number(process.env.ML_CONCURRENCY) || 8;
+const ML_RETRIES = process.env.ML_RETRIES !== undefined ? Number(process.env.ML_RETRIES) : 2;
+const ML_MAX_SOCKETS = Number(process.env.ML_MAX_SOCKETS) || 32;
+const RETRY_BASE_MS = 100;
+const RETRY_MAX_MS = 1000;
+const HEALTH_TIMEOUT_MS = 2000;
+
+// One pool of kept-alive sockets for every call to the ML service, so a
+// fan-out over ten artists reuses connections instead of opening ten.
+const agentOptions = { keepAlive: true, maxSockets: ML_MAX_SOCKETS };
+const client = axios.create({
+  httpAgent: new http.Agent(agentOptions),
+  httpsAgent: new https.Agent(agentOptions),
+  // FastAPI reads list parameters as repeated keys (?a=1&a=2), not a[]=1
+  paramsSerializer: { indexes: null },
+});
+
+// last X-Model-Version the ML service reported, and who wants to hear when it changes
+let currentModelVersion = null;
+const modelVersionListeners = [];
+let versionLookup = null;
+
+function onModelVersionChange(listener) {
+  modelVersionListeners.push(listener);
+}
+
+function modelVersion() {
+  return currentModelVersion;
+}
+
+function noteModelVersion(response) {
+  const version = response.headers?.['x-model-version'];
+  if (!version || version === currentModelVersion) return;
+  const previous = currentModelVersion;
+  currentModelVersion = version;
+  if (previous) console.log(`🔄 ML model version changed: ${previous} -> ${version}`);
+  // the first report too: anything cached before it was never checked against a version
+  modelVersionListeners.forEach(listener => listener(version, previous));
+}
+
+function baseUrl() {
+  const base = process.env.ML_SERVICE_URL;
+  return base ? base.replace(/\/$/, '') : null;
+}
+
+function isConfigured() {
+  return Boolean(baseUrl());
+}
+
+// the ML service's own total from its Server-Timing header, in ms
+function serviceMs(response) {
+  const match = /(?:^|,)\s*total;dur=([\d.]+)/.exec(response.headers?.['server-timing'] || '');
+  return match ? Number(match[1]) : null;
+}
+
+function isRetryable(err) {
+  if (err.code === 'ML_DEADLINE_EXCEEDED') return false;
+  if (!err.response) return true; // timeout, reset, refused
+  return err.response.status >= 500 || err.response.status === 429;
+}
+
+function deadlineError(path) {
+  const err = new Error(`ML service deadline exceeded for ${path}`);
+  err.code = 'ML_DEADLINE_EXCEEDED';
+  return err;
+}
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+/**
+ * Request against ML_SERVICE_URL with a deadline covering all attempts.
+ * Network errors, 429 and 5xx are retried with full-jitter exponential
+ * backoff while time remains. Resolves with the axios response.
+ *
+ * The current request id is forwarded as X-Request-Id; the call is traced as
+ * stage "ml", and the service's own time (its Server-Timing total) as "ml-app".
+ */
+function request(method, path, options) {
+  return tracing.span('ml', () => send(method, path, options));
+}
+
+async function send(method, path, { params, data, headers, timeout = ML_TIMEOUT_MS, deadline,
+  retries = ML_RETRIES, validateStatus } = {}) {
+  const base = baseUrl();
+  if (!base) {
+    throw new Error('ML_SERVICE_URL is not configured');
+  }
+  const until = deadline || Date.now() + timeout;
+  const requestId = tracing.requestId();
+  if (requestId) headers = { ...headers, 'X-Request-Id': requestId };
+
+  for (let attempt = 0; ; attempt++) {
+    const remaining = until - Date.now();
+    if (remaining <= 0) throw deadlineError(path);
+    try {
+      const response = await client.request({
+        method, url: `${base}${path}`, params, data, headers, timeout: remaining, validateStatus,
+      });
+      noteModelVersion(response);
+      const appMs = serviceMs(response);
+      if (appMs !== null) {
+        const end = performance.now();
+        tracing.record('ml-app', end - appMs, end);
+      }
+      return response;
+    } catch (err) {
+      if (attempt >= retries || !isRetryable(err)) throw err;
+      const delay = Math.random() * Math.min(RETRY_MAX_MS, RETRY_BASE_MS * 2 ** attempt);
+      if (Date.now() + delay >= until) throw err;
+      await sleep(delay);
+    }
+  }
+}
+
+/**
+ * The current model version, asking GET /health when the service has not
+ * reported one yet. Resolves with null when it can't be reached.
+ */
+function resolveModelVersion() {
+  if (currentModelVersion || !isConfigured()) return Promise.resolve(currentModelVersion);
+  if (!versionLookup) {
+    versionLookup = request('get', '/health', { timeout: HEALTH_TIMEOUT_MS, retries: 0 })
+      .then(() => currentModelVersion, () => null)
+      .finally(() => {
+        versionLookup = null;
+      });
+  }
+  return versionLookup;
+}
+
+async function get(path, options) {
+  const { data } = await request('get', path, options);
+  return data;
+}
+
+/**
+ * Run fn over items with at most `limit` calls in flight. Results come back
+ * in input order as Promise.allSettled-style { status, value | reason }.
+ */
+async function mapWithConcurrency(items, fn, limit = ML_CONCURRENCY) {
+  const results = new Array(items.length);
+  let next = 0;
+  const worker = async () => {
+    while (next < items.length) {
+      const i = next++;
+      try {
+        results[i] = { status: 'fulfilled', value: await fn(items[i], i) };
+      } catch (reason) {
+        results[i] = { status: 'rejected', reason };
+      }
+    }
+  };
+  await Promise.all(Array.from({ length: Math.min(limit, items.length) }, worker));
+  return results;
+}
+
+/**
+ * GET /predict for one artist; resolves with the response body.
+ */
+function predict(artistName, options = {}) {
+  const { params, ...rest } = options;
+  return get('/predict', { ...rest, params: { user_id: artistName, ...params } });
+}
+
+/**
+ * /predict for many artists in parallel (bounded), all under one deadline.
+ * Resolves with a Map of artistName -> top_items; failures are logged and
+ * left out.
+ */
+async function predictMany(artistNames, { timeout = ML_TIMEOUT_MS, concurrency = ML_CONCURRENCY, ...options } = {}) {
+  const deadline = Date.now() + timeout;
+  const settled = await mapWithConcurrency(
+    artistNames, artistName => predict(artistName, { ...options, deadline }), concurrency
+  );
+
+  const topItems = new Map();
+  settled.forEach((result, i) => {
+    if (result.status === 'fulfilled' && Array.isArray(result.value?.top_items)) {
+      topItems.set(artistNames[i], result.value.top_items);
+    } else {
+      const reason = result.status === 'rejected' ? result.reason.message : 'invalid ML response format';
+      console.warn(`⚠️ Failed to get recommendations for ${artistNames[i]}:`, reason);
+    }
+  });
+  return topItems;
+}
+
+module.exports = {
+  isConfigured,
+  modelVersion,
+  resolveModelVersion,
+  onModelVersionChange,
+  request,
+  get,
+  predict,
+  predictMany,
+  mapWithConcurrency,
+};
@@ -0,0 +1,117 @@
+const http = require('http');
+const crypto = require('crypto');
+
+/**
+ * Local stand-in for the Spotify Web API endpoints the server calls, for
+ * exercising caching and rate-limit handling without a Spotify account or
+ * quota. Point the server at it with SPOTIFY_API_BASE=http://localhost:<port>/v1.
+ *
+ * Optionally it enforces its own rate limit (`ratePerSec`), answering 429
+ * with Retry-After like Spotify does, and delays every answer by `latencyMs`.
+ *
+ * Usage: node utils/mockSpotifyServer.js [port] [ratePerSec]
+ */
+const SAMPLE_ARTISTS = ['Radiohead', 'Daft Punk', 'Björk', 'Aphex Twin', 'Portishead',
+  'Massive Attack', 'Boards of Canada', 'The Knife', 'Burial', 'Four Tet'].map((name, i) => ({
+  id: `mock_artist_${i}`,
+  name,
+  genres: ['electronic'],
+  popularity: 90 - i,
+  images: i % 4 === 3 ? [] : [{ url: `https://i.scdn.co/image/mock_${i}`, width: 640, height: 640 }],
+}));
+
+function startMockSpotify({ port = 0, artists = SAMPLE_ARTISTS, ratePerSec = 0, retryAfterSec = 1, latencyMs = 0 } = {}) {
+  const stats = { requests: 0, ok: 0, notModified: 0, unauthorized: 0, rateLimited: 0, tokens: 0, maxConcurrent: 0 };
+  let items = artists;
+  let windowStart = Date.now();
+  let windowCount = 0;
+  let concurrent = 0;
+
+  // fixed one-second windows: the (ratePerSec + 1)th request in a window gets a 429
+  const overLimit = () => {
+    if (!ratePerSec) return false;
+    const now = Date.now();
+    if (now - windowStart >= 1000) {
+      windowStart = now;
+      windowCount = 0;
+    }
+    return ++windowCount > ratePerSec;
+  };
+
+  const server = http.createServer((req, res) => {
+    stats.requests++;
+    stats.maxConcurrent = Math.max(stats.maxConcurrent, ++concurrent);
+    res.on('finish', () => concurrent--);
+    setTimeout(() => handle(req, res), latencyMs);
+  });
+
+  const handle = (req, res) => {
+    const url = new URL(req.url, 'http://localhost');
+
+    if (overLimit()) {
+      stats.rateLimited++;
+      res.writeHead(429, { 'Content-Type': 'application/json', 'Retry-After': String(retryAfterSec) });
+      return res.end(JSON.stringify({ error: { status: 429, message: 'API rate limit exceeded' } }));
+    }
+
+    if (req.method === 'POST' && url.pathname === '/api/token') {
+      stats.tokens++;
+      res.writeHead(200, { 'Content-Type': 'application/json' });
+      return res.end(JSON.stringify({
+        access_token: `mock_token_${stats.tokens}`, token_type: 'Bearer', expires_in: 3600,
+        refresh_token: `mock_refresh_${stats.tokens}`, scope: 'user-top-read',
+      }));
+    }
+
+    if (!/^Bearer \S+/.test(req.headers.authorization || '')) {
+      stats.unauthorized++;
+      res.writeHead(401, { 'Content-Type': 'application/json' });
+      return res.end(JSON.stringify({ error: { status: 401, message: 'No token provided' } }));
+    }
+
+    if (req.method === 'GET' && url.pathname === '/v1/me/top/artists') {
+      const limit = Number(url.searchParams.get('limit')) || 20;
+      const body = JSON.stringify({ items: items.slice(0, limit), total: items.length, limit, offset: 0 });
+      const etag = `"${crypto.createHash('sha1').update(body).digest('hex')}"`;
+      if (req.headers['if-none-match'] === etag) {
+        stats.notModified++;
+        res.writeHead(304, { ETag: etag });
+        return res.end();
+      }
+      stats.ok++;
+      res.writeHead(200, { 'Content-Type': 'application/json', ETag: etag });
+      return res.end(body);
+    }
+
+    res.writeHead(404, { 'Content-Type': 'application/json' });
+    res.end(JSON.stringify({ error: { status: 404, message: 'Service not found' } }));
+  };
+
+  return new Promise(resolve => {
+    server.listen(port, '127.0.0.1', () => {
+      resolve({
+        server,
+        stats,
+        url: `http://127.0.0.1:${server.address().port}/v1`,
+        accountsUrl: `http://127.0.0.1:${server.address().port}`,
+        setArtists(next) {
+          items = next;
+        },
+        close: () => new Promise(done => {
+          server.close(done);
+          server.closeAllConnections(); // clients keep sockets alive
+        }),
+      });
+    });
+  });
+}
+
+if (require.main === module) {
+  const [port, ratePerSec] = process.argv.slice(2).map(Number);
+  startMockSpotify({ port: port || 8089, ratePerSec: ratePerSec || 0 }).then(({ url, accountsUrl, stats }) => {
+    console.log(`🎭 Mock Spotify API on ${url} (accounts on ${accountsUrl})`);
+    setInterval(() => console.log('📊', stats), 10000).unref();
+  });
+}
+
+module.exports = { startMockSpotify, SAMPLE_ARTISTS };
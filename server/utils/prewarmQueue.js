@@ -0,0 +1,95 @@
+const mlClient = require('./mlClient');
+const tracing = require('./tracing');
+const topArtistsCache = require('./topArtistsCache');
+const { getCatalogue } = require('./artistCatalogue');
+const { lookupArtistRecommendations } = require('./fetchRecommendations');
+
+const PREWARM_CONCURRENCY = process.env.PREWARM_CONCURRENCY !== undefined ? Number(process.env.PREWARM_CONCURRENCY) : 2;
+const PREWARM_MAX_QUEUE = Number(process.env.PREWARM_MAX_QUEUE) || 100;
+
+/**
+ * Background prewarming after a Spotify login.
+ *
+ * While the browser follows the OAuth redirect, a job loads the session's top
+ * artists (into topArtistsCache), resolves them against the ML catalogue and
+ * fills the recommendation cache for the available ones, so the first
+ * /top_artists and /check_artists_availability calls are cache hits.
+ *
+ * Jobs run PREWARM_CONCURRENCY at a time (0 turns prewarming off) from a
+ * FIFO of at most PREWARM_MAX_QUEUE; a session already queued or running is
+ * not queued twice, and jobs that don't fit are dropped; prewarming is only
+ * an optimisation.
+ */
+const queue = [];
+const queued = new Set(); // session ids queued or running
+let running = 0;
+const counters = { enqueued: 0, dropped: 0, completed: 0, failed: 0, artistsWarmed: 0, totalMs: 0 };
+
+async function prewarm(sessionId, accessToken) {
+  const start = Date.now();
+  const { artistNames } = await topArtistsCache.getTopArtists(sessionId, accessToken);
+  if (!mlClient.isConfigured() || artistNames.length === 0) return;
+
+  const { set: availableArtists } = await getCatalogue();
+  const available = artistNames.filter(artistName => availableArtists.has(artistName));
+  if (available.length > 0) {
+    const warmed = await lookupArtistRecommendations(available);
+    counters.artistsWarmed += warmed.size;
+  }
+  console.log(`🔥 Prewarmed ${available.length}/${artistNames.length} top artists for a new login in ${Date.now() - start}ms`);
+}
+
+function runNext() {
+  while (running < PREWARM_CONCURRENCY && queue.length > 0) {
+    const { sessionId, accessToken, enqueuedAt } = queue.shift();
+    running++;
+    prewarm(sessionId, accessToken)
+      .then(() => {
+        counters.completed++;
+      })
+      .catch(err => {
+        counters.failed++;
+        console.warn('⚠️ Prewarm job failed:', err.message);
+      })
+      .finally(() => {
+        counters.totalMs += Date.now() - enqueuedAt;
+        running--;
+        queued.delete(sessionId);
+        runNext();
+      });
+  }
+}
+
+/**
+ * Queue a prewarm job for a session that just logged in. Returns whether it
+ * was queued.
+ */
+function enqueue(sessionId, accessToken) {
+  if (PREWARM_CONCURRENCY <= 0 || queued.has(sessionId)) return false;
+  if (queue.length >= PREWARM_MAX_QUEUE) {
+    counters.dropped++;
+    return false;
+  }
+  queued.add(sessionId);
+  queue.push({ sessionId, accessToken, enqueuedAt: Date.now() });
+  counters.enqueued++;
+  // after the login response is on its way, and not as part of its trace
+  tracing.detached(() => setImmediate(runNext));
+  return true;
+}
+
+function stats() {
+  const finished = counters.completed + counters.failed;
+  return {
+    ...counters,
+    queueLength: queue.length,
+    running,
+    concurrency: PREWARM_CONCURRENCY,
+    meanJobMs: finished ? Math.round(counters.totalMs / finished) : null,
+  };
+}
+
+module.exports = {
+  enqueue,
+  stats,
+};
@@ -0,0 +1,212 @@
+const ArtistRecommendation = require('../models/ArtistRecommendation');
+const mlClient = require('./mlClient');
+const tracing = require('./tracing');
+
+const REC_CACHE_MAX_ENTRIES = Number(process.env.REC_CACHE_MAX_ENTRIES) || 5000;
+const REC_ACCESS_FLUSH_MS = Number(process.env.REC_ACCESS_FLUSH_MS) || 10000;
+const REC_CACHE_TTL_MS = Number(process.env.REC_CACHE_TTL_MS) || 7 * 24 * 60 * 60 * 1000;
+const AGE_BUCKETS_MS = [0, 60 * 60 * 1000, 24 * 60 * 60 * 1000, 7 * 24 * 60 * 60 * 1000, 30 * 24 * 60 * 60 * 1000];
+const AGE_BUCKET_LABELS = ['<1h', '1h-1d', '1d-7d', '7d-30d'];
+
+/**
+ * In-process LRU tier in front of the ArtistRecommendation collection.
+ *
+ * Hits are answered from memory; misses for a whole request are fetched with
+ * a single $in query. lastAccessed is not written per hit: the latest access
+ * time per artist is buffered and flushed with one bulkWrite every
+ * REC_ACCESS_FLUSH_MS (and on shutdown via flushAccessTimes).
+ *
+ * Entries in both tiers carry the ML model version that produced them and an
+ * expiresAt the collection's TTL index reaps. Every hit is checked against
+ * both: entries from another model version, or past expiresAt but not yet
+ * reaped or evicted, are treated as misses and recomputed. Until the current
+ * model version is known (it is asked for once via /health) nothing is fresh.
+ */
+const lru = new Map(); // artistName -> { recommendations, modelVersion, expiresAt }; Map order is recency order
+const pendingAccess = new Map(); // artistName -> Date
+const counters = { lruHits: 0, mongoHits: 0, misses: 0, staleRejected: 0 };
+
+function isFresh(entry, modelVersion, now) {
+  if (!modelVersion || entry.modelVersion !== modelVersion) return false;
+  return Boolean(entry.expiresAt) && entry.expiresAt > now; // entries from before expiresAt count as expired
+}
+
+function remember(artistName, entry) {
+  lru.delete(artistName);
+  lru.set(artistName, entry);
+  if (lru.size > REC_CACHE_MAX_ENTRIES) {
+    lru.delete(lru.keys().next().value);
+  }
+}
+
+function touch(artistName) {
+  pendingAccess.set(artistName, new Date());
+}
+
+/**
+ * Cached recommendations for the given artists: Map artistName -> recommendations.
+ * Artists in neither tier are simply absent from the result.
+ */
+async function getMany(artistNames) {
+  const found = new Map();
+  const misses = [];
+  const modelVersion = await mlClient.resolveModelVersion();
+  const now = new Date();
+  for (const artistName of new Set(artistNames)) {
+    const entry = lru.get(artistName);
+    if (entry && isFresh(entry, modelVersion, now)) {
+      counters.lruHits++;
+      remember(artistName, entry);
+      found.set(artistName, entry.recommendations);
+      touch(artistName);
+    } else {
+      if (entry) {
+        counters.staleRejected++;
+        lru.delete(artistName);
+      }
+      misses.push(artistName);
+    }
+  }
+
+  if (misses.length > 0) {
+    const docs = await tracing.span('mongo', () => ArtistRecommendation.find({ artistName: { $in: misses } })
+      .select('artistName recommendations modelVersion expiresAt')
+      .lean());
+    let served = 0;
+    for (const doc of docs) {
+      if (!isFresh(doc, modelVersion, now)) {
+        counters.staleRejected++;
+        continue;
+      }
+      served++;
+      remember(doc.artistName, {
+        recommendations: doc.recommendations, modelVersion: doc.modelVersion, expiresAt: doc.expiresAt,
+      });
+      found.set(doc.artistName, doc.recommendations);
+      touch(doc.artistName);
+    }
+    counters.mongoHits += served;
+    counters.misses += misses.length - served;
+  }
+  return found;
+}
+
+/**
+ * Store freshly computed recommendations in both tiers (one bulkWrite).
+ */
+async function putMany(entries) {
+  if (entries.size === 0) return;
+  const now = new Date();
+  const expiresAt = new Date(now.getTime() + REC_CACHE_TTL_MS);
+  const modelVersion = mlClient.modelVersion();
+  const ops = [];
+  for (const [artistName, recommendations] of entries) {
+    remember(artistName, { recommendations, modelVersion, expiresAt });
+    ops.push({
+      updateOne: {
+        filter: { artistName },
+        update: {
+          $set: { recommendations, modelVersion, cachedAt: now, expiresAt, lastAccessed: now },
+          $setOnInsert: { artistId: artistName }, // Using artist name as ID for now
+        },
+        upsert: true,
+      },
+    });
+  }
+  await tracing.span('mongo', () => ArtistRecommendation.bulkWrite(ops, { ordered: false }));
+}
+
+/**
+ * Give entries written before expiresAt existed one (cachedAt + TTL), so the
+ * TTL index reaps them too. Returns how many were updated.
+ */
+async function backfillExpiry() {
+  const { modifiedCount } = await ArtistRecommendation.updateMany(
+    { expiresAt: { $exists: false } },
+    [{ $set: { expiresAt: { $add: [{ $ifNull: ['$cachedAt', '$$NOW'] }, REC_CACHE_TTL_MS] } } }]
+  );
+  return modifiedCount;
+}
+
+function evict(artistName) {
+  lru.delete(artistName);
+  pendingAccess.delete(artistName);
+}
+
+function clear() {
+  lru.clear();
+  pendingAccess.clear();
+}
+
+/**
+ * Write buffered lastAccessed times to Mongo in one bulkWrite.
+ */
+async function flushAccessTimes() {
+  if (pendingAccess.size === 0) return;
+  const batch = [...pendingAccess];
+  pendingAccess.clear();
+  try {
+    await ArtistRecommendation.bulkWrite(
+      batch.map(([artistName, lastAccessed]) => ({
+        updateOne: { filter: { artistName }, update: { $max: { lastAccessed } } },
+      })),
+      { ordered: false }
+    );
+  } catch (err) {
+    console.warn(`⚠️ Failed to flush ${batch.length} lastAccessed updates:`, err.message);
+  }
+}
+
+/**
+ * Cache size, hit ratio since start-up and the age / model-version spread of
+ * the Mongo tier.
+ */
+async function stats() {
+  const now = new Date();
+  const [total, byModelVersion, byAge] = await Promise.all([
+    ArtistRecommendation.estimatedDocumentCount(),
+    ArtistRecommendation.aggregate([{ $group: { _id: '$modelVersion', count: { $sum: 1 } } }]),
+    ArtistRecommendation.aggregate([{
+      $bucket: {
+        groupBy: { $subtract: [now, '$cachedAt'] },
+        boundaries: AGE_BUCKETS_MS,
+        default: 'older',
+        output: { count: { $sum: 1 } },
+      },
+    }]),
+  ]);
+
+  const lookups = counters.lruHits + counters.mongoHits + counters.misses;
+  const ageDistribution = Object.fromEntries([...AGE_BUCKET_LABELS, '>30d'].map(label => [label, 0]));
+  for (const bucket of byAge) {
+    const label = bucket._id === 'older' ? '>30d' : AGE_BUCKET_LABELS[AGE_BUCKETS_MS.indexOf(bucket._id)];
+    ageDistribution[label] = bucket.count;
+  }
+
+  return {
+    modelVersion: mlClient.modelVersion(),
+    ttlMs: REC_CACHE_TTL_MS,
+    memory: { entries: lru.size, maxEntries: REC_CACHE_MAX_ENTRIES, pendingAccessUpdates: pendingAccess.size },
+    mongo: {
+      entries: total,
+      byModelVersion: Object.fromEntries(byModelVersion.map(group => [group._id || 'unknown', group.count])),
+      ageDistribution,
+    },
+    lookups: { ...counters, total: lookups, hitRatio: lookups ? (counters.lruHits + counters.mongoHits) / lookups : null },
+  };
+}
+
+// recommendations from an older model must not be served from memory either
+mlClient.onModelVersionChange(() => lru.clear());
+
+setInterval(flushAccessTimes, REC_ACCESS_FLUSH_MS).unref();
+
+module.exports = {
+  getMany,
+  putMany,
+  evict,
+  clear,
+  backfillExpiry,
+  flushAccessTimes,
+  stats,
+};
@@ -1,5 +1,3 @@
-const axios = require('axios');
-
 /**
  * Calculate weighted score based on recommendation frequency across artists
  */
@@ -23,6 +21,47 @@ function calculateWeightedScore(trackId, artistRecommendations) {
   return score + diversityBonus;
 }
 
+/**
+ * Ranking order: higher finalScore first, ties in first-seen order (the
+ * order a stable sort of the track map would give).
+ */
+function ranksBefore(a, b) {
+  return a.finalScore > b.finalScore || (a.finalScore === b.finalScore && a.order < b.order);
+}
+
+/**
+ * Binary max-heap over track entries, built in O(n); popping the best
+ * entry is O(log n), so selecting k of n tracks never sorts all n.
+ */
+function heapify(items) {
+  for (let i = (items.length >> 1) - 1; i >= 0; i--) siftDown(items, i);
+  return items;
+}
+
+function siftDown(items, i) {
+  const n = items.length;
+  for (;;) {
+    const left = 2 * i + 1;
+    const right = left + 1;
+    let best = i;
+    if (left < n && ranksBefore(items[left], items[best])) best = left;
+    if (right < n && ranksBefore(items[right], items[best])) best = right;
+    if (best === i) return;
+    [items[i], items[best]] = [items[best], items[i]];
+    i = best;
+  }
+}
+
+function popBest(items) {
+  const top = items[0];
+  const last = items.pop();
+  if (items.length > 0) {
+    items[0] = last;
+    siftDown(items, 0);
+  }
+  return top;
+}
+
 /**
  * Curation algorithm
  */
@@ -33,72 +72,73 @@ async function getCuratedRecommendations(artistRecommendations, targetCount = 5)
 
   console.log(`🎯 Curating recommendations from ${artistRecommendations.length} artists`);
 
-  // Step 1: Create a frequency map of all recommended tracks
+  // Step 1: One pass over every list builds each track's frequency and
+  // weighted score. Lists are walked artist by artist, so the first time a
+  // track shows up for an artist is its position in that list.
   const trackFrequency = new Map();
-  const artistSets = artistRecommendations.map(recs => new Set(recs));
-
   artistRecommendations.forEach((recs, artistIndex) => {
     recs.forEach((trackId, position) => {
-      if (!trackFrequency.has(trackId)) {
-        trackFrequency.set(trackId, {
+      let trackData = trackFrequency.get(trackId);
+      if (!trackData) {
+        trackData = {
+          trackId,
+          order: trackFrequency.size,
           count: 0,
-          positions: [],
           artists: [],
+          appearances: 0,
+          lastArtist: -1,
           weightedScore: 0
-        });
+        };
+        trackFrequency.set(trackId, trackData);
       }
-      
-      const trackData = trackFrequency.get(trackId);
+
       trackData.count++;
-      trackData.positions.push(position);
       trackData.artists.push(artistIndex);
+      if (trackData.lastArtist !== artistIndex) {
+        // Higher weight for earlier positions: 5, 4, 3, 2, 1 for positions 0-4
+        trackData.weightedScore += Math.max(0, 5 - position);
+        trackData.appearances++;
+        trackData.lastArtist = artistIndex;
+      }
     });
   });
 
-
-  // Step 2: Calculate weighted scores for each track
-  for (const [trackId, trackData] of trackFrequency) {
-    trackData.weightedScore = calculateWeightedScore(trackId, artistRecommendations);
+  // Step 2: Diversity bonus for tracks several artists share, plus the frequency bonus
+  const tracks = [];
+  for (const trackData of trackFrequency.values()) {
+    if (trackData.appearances > 1) {
+      trackData.weightedScore += Math.log(trackData.appearances) * 0.5;
+    }
+    trackData.finalScore = trackData.weightedScore + (trackData.count * 0.5);
+    tracks.push(trackData);
   }
 
-  // Step 3: Sort tracks by weighted score and select top recommendations
-  const sortedTracks = Array.from(trackFrequency.entries())
-    .map(([trackId, data]) => ({
-      trackId,
-      ...data,
-      finalScore: data.weightedScore + (data.count * 0.5) // Frequency bonus
-    }))
-    .sort((a, b) => b.finalScore - a.finalScore);
-
-  // Step 5: Apply diversity filtering to avoid too many tracks from same artists
+  // Step 3: Take tracks best-first from a heap, skipping ones that would put
+  // an artist over its share; stop as soon as targetCount are chosen
+  const heap = heapify(tracks);
   const finalRecommendations = [];
+  const skipped = [];
   const artistCounts = new Array(artistRecommendations.length).fill(0);
   const maxPerArtist = Math.ceil(targetCount / artistRecommendations.length) + 1;
 
-  for (const track of sortedTracks) {
-    if (finalRecommendations.length >= targetCount) break;
-    
-    // Check if we can add this track without exceeding per-artist limits
-    const canAdd = track.artists.every(artistIndex => 
-      artistCounts[artistIndex] < maxPerArtist
-    );
-    
+  while (finalRecommendations.length < targetCount && heap.length > 0) {
+    const track = popBest(heap);
+    const canAdd = track.artists.every(artistIndex => artistCounts[artistIndex] < maxPerArtist);
     if (canAdd) {
       finalRecommendations.push(track.trackId);
       track.artists.forEach(artistIndex => {
         artistCounts[artistIndex]++;
       });
+    } else {
+      skipped.push(track);
     }
   }
 
-  // Step 6: If we don't have enough diverse tracks, fill with highest scoring
-  while (finalRecommendations.length < targetCount && finalRecommendations.length < sortedTracks.length) {
-    const nextTrack = sortedTracks.find(track => !finalRecommendations.includes(track.trackId));
-    if (nextTrack) {
-      finalRecommendations.push(nextTrack.trackId);
-    } else {
-      break;
-    }
+  // Step 4: If we don't have enough diverse tracks, fill with the highest
+  // scoring skipped ones (already in ranking order)
+  for (const track of skipped) {
+    if (finalRecommendations.length >= targetCount) break;
+    finalRecommendations.push(track.trackId);
   }
 
   console.log(`✅ Generated ${finalRecommendations.length} curated recommendations`);
@@ -0,0 +1,137 @@
+const Recommendation = require('../models/Recommendation');
+
+const REC_HISTORY_BATCH_SIZE = Number(process.env.REC_HISTORY_BATCH_SIZE) || 100;
+const REC_HISTORY_FLUSH_MS = Number(process.env.REC_HISTORY_FLUSH_MS) || 1000;
+const REC_HISTORY_MAX_PENDING = Number(process.env.REC_HISTORY_MAX_PENDING) || 5000;
+
+/**
+ * Write-behind queue for Recommendation history.
+ *
+ * record() builds the document (with its _id and timestamps) and returns it
+ * straight away; documents are written with one insertMany once
+ * REC_HISTORY_BATCH_SIZE are buffered or REC_HISTORY_FLUSH_MS after the first
+ * one, whichever comes first. Only one insertMany runs at a time. When
+ * REC_HISTORY_MAX_PENDING documents are waiting, record() waits for the
+ * next write attempt (never starting one itself) before queueing, so a slow
+ * database slows writers down instead of growing the buffer without bound,
+ * and one that is down is retried every REC_HISTORY_FLUSH_MS, not in a loop.
+ */
+let buffer = [];
+let timer = null;
+let inFlight = null; // promise of the running insertMany
+let inFlightCount = 0;
+let roomWaiters = []; // record() calls waiting for the next write attempt
+const counters = { recorded: 0, written: 0, failed: 0, requeued: 0, backpressureWaits: 0 };
+
+function pending() {
+  return buffer.length + inFlightCount;
+}
+
+function schedule() {
+  if (buffer.length >= REC_HISTORY_BATCH_SIZE) {
+    flushSoon();
+  } else {
+    flushLater();
+  }
+}
+
+function flushLater() {
+  if (timer) return;
+  timer = setTimeout(flushSoon, REC_HISTORY_FLUSH_MS);
+  timer.unref();
+}
+
+function wakeWaiters() {
+  const waiting = roomWaiters;
+  roomWaiters = [];
+  waiting.forEach(resolve => resolve());
+}
+
+function flushSoon() {
+  flush().catch(() => {}); // flush() logs its own failures
+}
+
+/**
+ * insertMany one batch. Resolves false if the batch had to be requeued.
+ */
+async function writeBatch(batch) {
+  try {
+    await Recommendation.insertMany(batch, { ordered: false });
+    counters.written += batch.length;
+    return true;
+  } catch (err) {
+    if (err.writeErrors || err.insertedDocs) {
+      // per-document failures (validation, duplicate _id): retrying won't help
+      const failed = err.writeErrors ? err.writeErrors.length : batch.length - err.insertedDocs.length;
+      counters.written += batch.length - failed;
+      counters.failed += failed;
+      console.warn(`⚠️ ${failed} recommendation history documents were rejected:`, err.message);
+      return true;
+    }
+    // the whole batch failed (connection lost, timeout): put it back if there is room
+    const room = Math.max(0, REC_HISTORY_MAX_PENDING - buffer.length);
+    const requeue = batch.slice(0, room);
+    buffer = requeue.concat(buffer);
+    counters.requeued += requeue.length;
+    counters.failed += batch.length - requeue.length;
+    console.warn(`⚠️ Failed to write ${batch.length} recommendation history documents (${requeue.length} requeued):`, err.message);
+    return requeue.length === 0;
+  }
+}
+
+/**
+ * Write everything buffered, a batch at a time. Resolves once it is in Mongo
+ * or a batch failed and was requeued for the next attempt, so shutdown can
+ * await it.
+ */
+async function flush() {
+  if (timer) {
+    clearTimeout(timer);
+    timer = null;
+  }
+  for (;;) {
+    while (inFlight) await inFlight;
+    if (buffer.length === 0) return;
+
+    const batch = buffer.splice(0, REC_HISTORY_BATCH_SIZE);
+    inFlightCount = batch.length;
+    inFlight = writeBatch(batch).finally(() => {
+      inFlight = null;
+      inFlightCount = 0;
+      wakeWaiters();
+    });
+    if (!(await inFlight)) {
+      flushLater(); // don't hammer a database that just failed
+      return;
+    }
+  }
+}
+
+/**
+ * Queue a Recommendation for writing and return the document as it will be
+ * stored (_id, createdAt and updatedAt included).
+ */
+async function record(fields) {
+  while (pending() >= REC_HISTORY_MAX_PENDING) {
+    counters.backpressureWaits++;
+    if (!inFlight) flushLater(); // no-op when a retry is already scheduled
+    await new Promise(resolve => roomWaiters.push(resolve));
+  }
+
+  const now = new Date();
+  const doc = new Recommendation({ ...fields, createdAt: now, updatedAt: now });
+  buffer.push(doc);
+  counters.recorded++;
+  schedule();
+  return doc;
+}
+
+function stats() {
+  return { ...counters, buffered: buffer.length, inFlight: inFlightCount, maxPending: REC_HISTORY_MAX_PENDING };
+}
+
+module.exports = {
+  record,
+  flush,
+  stats,
+};
@@ -0,0 +1,234 @@
+const http = require('http');
+const https = require('https');
+const axios = require('axios');
+const tracing = require('./tracing');
+
+const SPOTIFY_API_BASE = (process.env.SPOTIFY_API_BASE || 'https://api.spotify.com/v1').replace(/\/$/, '');
+const SPOTIFY_ACCOUNTS_BASE = (process.env.SPOTIFY_ACCOUNTS_BASE || 'https://accounts.spotify.com').replace(/\/$/, '');
+const SPOTIFY_RATE_PER_SEC = Number(process.env.SPOTIFY_RATE_PER_SEC) || 10;
+const SPOTIFY_BURST = Number(process.env.SPOTIFY_BURST) || 20;
+const SPOTIFY_MAX_QUEUE = Number(process.env.SPOTIFY_MAX_QUEUE) || 200;
+const SPOTIFY_ACCOUNTS_RATE_PER_SEC = Number(process.env.SPOTIFY_ACCOUNTS_RATE_PER_SEC) || 5;
+const SPOTIFY_ACCOUNTS_BURST = Number(process.env.SPOTIFY_ACCOUNTS_BURST) || 10;
+const SPOTIFY_RETRIES = process.env.SPOTIFY_RETRIES !== undefined ? Number(process.env.SPOTIFY_RETRIES) : 2;
+const SPOTIFY_MAX_RETRY_WAIT_MS = Number(process.env.SPOTIFY_MAX_RETRY_WAIT_MS) || 10000;
+const SPOTIFY_TIMEOUT_MS = Number(process.env.SPOTIFY_TIMEOUT_MS) || 10000;
+const DEFAULT_RETRY_AFTER_MS = 1000;
+const RETRY_BASE_MS = 100;
+const RETRY_MAX_MS = 1000;
+
+/**
+ * Every call the server makes to Spotify goes through here.
+ *
+ * - A token bucket (SPOTIFY_RATE_PER_SEC, bursts of SPOTIFY_BURST) paces
+ *   requests across all users; callers beyond it wait in a FIFO queue of at
+ *   most SPOTIFY_MAX_QUEUE instead of all hitting Spotify at once.
+ * - A 429 pauses the whole bucket for the Retry-After Spotify sends (its
+ *   limits are per app, not per user) and the request is retried after it.
+ * - The accounts service (token exchange) has its own bucket
+ *   (SPOTIFY_ACCOUNTS_RATE_PER_SEC / SPOTIFY_ACCOUNTS_BURST), so a busy or
+ *   paused Web API queue never holds up a login.
+ * - Identical GETs in flight at the same time (same URL, params, headers
+ *   and validateStatus, so the same user) share one request.
+ *
+ * Time spent (queueing included) is traced as stage "spotify".
+ */
+const agentOptions = { keepAlive: true };
+const client = axios.create({
+  httpAgent: new http.Agent(agentOptions),
+  httpsAgent: new https.Agent(agentOptions),
+  timeout: SPOTIFY_TIMEOUT_MS,
+});
+
+const counters = {
+  requests: 0, coalesced: 0, queued: 0, queueFull: 0, rateLimited: 0, retries: 0, errors: 0, queueWaitMs: 0,
+};
+
+function createBucket(ratePerSec, burst) {
+  return { ratePerSec, burst, tokens: burst, lastRefill: Date.now(), pausedUntil: 0, drainTimer: null, waiters: [] };
+}
+
+const apiBucket = createBucket(SPOTIFY_RATE_PER_SEC, SPOTIFY_BURST);
+const accountsBucket = createBucket(SPOTIFY_ACCOUNTS_RATE_PER_SEC, SPOTIFY_ACCOUNTS_BURST);
+const inFlight = new Map(); // request key -> Promise<response>
+
+function bucketFor(url) {
+  // the API base is checked first: a local mock serves both from one host
+  if (url.startsWith(`${SPOTIFY_API_BASE}/`)) return apiBucket;
+  return url.startsWith(SPOTIFY_ACCOUNTS_BASE) ? accountsBucket : apiBucket;
+}
+
+function refill(bucket, now) {
+  if (now <= bucket.lastRefill) return;
+  bucket.tokens = Math.min(bucket.burst, bucket.tokens + ((now - bucket.lastRefill) * bucket.ratePerSec) / 1000);
+  bucket.lastRefill = now;
+}
+
+function scheduleDrain(bucket, ms) {
+  if (bucket.drainTimer) return;
+  bucket.drainTimer = setTimeout(drain, Math.max(1, ms), bucket);
+}
+
+function drain(bucket) {
+  bucket.drainTimer = null;
+  const now = Date.now();
+  if (now < bucket.pausedUntil) return scheduleDrain(bucket, bucket.pausedUntil - now);
+  refill(bucket, now);
+  while (bucket.waiters.length > 0 && bucket.tokens >= 1) {
+    bucket.tokens--;
+    const waiter = bucket.waiters.shift();
+    counters.queueWaitMs += now - waiter.since;
+    waiter.resolve();
+  }
+  if (bucket.waiters.length > 0) scheduleDrain(bucket, ((1 - bucket.tokens) * 1000) / bucket.ratePerSec);
+}
+
+function queueFullError(bucket) {
+  const err = new Error('Too many Spotify requests queued');
+  err.code = 'SPOTIFY_QUEUE_FULL';
+  err.retryAfterMs = Math.max(bucket.pausedUntil - Date.now(), (bucket.waiters.length * 1000) / bucket.ratePerSec);
+  return err;
+}
+
+/**
+ * Resolves when this caller may send a request through `bucket`.
+ */
+function acquire(bucket) {
+  const now = Date.now();
+  if (bucket.waiters.length === 0 && now >= bucket.pausedUntil) {
+    refill(bucket, now);
+    if (bucket.tokens >= 1) {
+      bucket.tokens--;
+      return Promise.resolve();
+    }
+  }
+  if (bucket.waiters.length >= SPOTIFY_MAX_QUEUE) {
+    counters.queueFull++;
+    return Promise.reject(queueFullError(bucket));
+  }
+  counters.queued++;
+  return new Promise(resolve => {
+    bucket.waiters.push({ resolve, since: now });
+    scheduleDrain(bucket, now < bucket.pausedUntil
+      ? bucket.pausedUntil - now
+      : ((1 - bucket.tokens) * 1000) / bucket.ratePerSec);
+  });
+}
+
+/**
+ * Retry-After is seconds or an HTTP date.
+ */
+function retryAfterMs(response) {
+  const value = response.headers?.['retry-after'];
+  if (value === undefined) return DEFAULT_RETRY_AFTER_MS;
+  const seconds = Number(value);
+  if (!Number.isNaN(seconds)) return seconds * 1000;
+  const date = Date.parse(value);
+  return Number.isNaN(date) ? DEFAULT_RETRY_AFTER_MS : Math.max(0, date - Date.now());
+}
+
+// Nothing is sent until the pause is over, and the bucket starts empty after
+// it so the queue resumes at the steady rate rather than with a burst.
+function pause(bucket, ms) {
+  bucket.pausedUntil = Math.max(bucket.pausedUntil, Date.now() + ms);
+  bucket.tokens = 0;
+  bucket.lastRefill = bucket.pausedUntil;
+}
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+async function send(config, retries) {
+  const bucket = bucketFor(config.url);
+  for (let attempt = 0; ; attempt++) {
+    await acquire(bucket);
+    counters.requests++;
+    try {
+      return await client.request(config);
+    } catch (err) {
+      const status = err.response?.status;
+      if (status === 429) {
+        counters.rateLimited++;
+        const wait = retryAfterMs(err.response);
+        pause(bucket, wait);
+        console.warn(`⚠️ Spotify rate limit hit, pausing requests for ${wait}ms`);
+        if (attempt < retries && wait <= SPOTIFY_MAX_RETRY_WAIT_MS) {
+          counters.retries++;
+          continue; // acquire() waits out the pause
+        }
+      } else if ((!err.response || status >= 500) && config.method === 'get' && attempt < retries) {
+        // only GETs are retried on 5xx / network errors: a token exchange must not be replayed
+        counters.retries++;
+        await sleep(Math.random() * Math.min(RETRY_MAX_MS, RETRY_BASE_MS * 2 ** attempt));
+        continue;
+      }
+      counters.errors++;
+      throw err;
+    }
+  }
+}
+
+// validateStatus by source: callers passing the same inline check share a request
+function requestKey(config) {
+  return JSON.stringify([config.url, config.params || null, config.headers || null,
+    config.validateStatus ? String(config.validateStatus) : null]);
+}
+
+/**
+ * Request against Spotify; `url` is absolute or a path under SPOTIFY_API_BASE.
+ * Resolves with the axios response; errors are axios errors, or one with
+ * code SPOTIFY_QUEUE_FULL (and retryAfterMs) when the queue is full.
+ */
+function request(method, url, { params, data, headers, validateStatus, retries = SPOTIFY_RETRIES } = {}) {
+  const config = {
+    method: method.toLowerCase(),
+    url: /^https?:\/\//.test(url) ? url : `${SPOTIFY_API_BASE}${url}`,
+    params, data, headers, validateStatus,
+  };
+  if (config.method !== 'get') return tracing.span('spotify', () => send(config, retries));
+
+  const key = requestKey(config);
+  if (inFlight.has(key)) {
+    counters.coalesced++;
+    return tracing.span('spotify', () => inFlight.get(key));
+  }
+  const promise = send(config, retries).finally(() => inFlight.delete(key));
+  inFlight.set(key, promise);
+  return tracing.span('spotify', () => promise);
+}
+
+async function get(url, options) {
+  const { data } = await request('get', url, options);
+  return data;
+}
+
+function accountsUrl(path) {
+  return `${SPOTIFY_ACCOUNTS_BASE}${path}`;
+}
+
+function bucketStats(bucket) {
+  const now = Date.now();
+  refill(bucket, now);
+  return {
+    queueLength: bucket.waiters.length,
+    tokens: Math.floor(bucket.tokens),
+    pausedForMs: Math.max(0, bucket.pausedUntil - now),
+    ratePerSec: bucket.ratePerSec,
+    burst: bucket.burst,
+  };
+}
+
+function stats() {
+  return {
+    ...counters,
+    ...bucketStats(apiBucket),
+    inFlight: inFlight.size,
+    accounts: bucketStats(accountsBucket),
+  };
+}
+
+module.exports = {
+  request,
+  get,
+  accountsUrl,
+  stats,
+};
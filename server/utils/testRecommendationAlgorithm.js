@@ -1,5 +1,9 @@
 // Import the functions directly without axios dependency
-const { getSimpleIntersectionRecommendations } = require('./recommendationCuration');
+const {
+  getSimpleIntersectionRecommendations,
+  getCuratedRecommendations: getProductionCuratedRecommendations,
+  calculateWeightedScore,
+} = require('./recommendationCuration');
 
 // Simplified version of getCuratedRecommendations for testing
 function getCuratedRecommendations(artistRecommendations, targetCount = 5) {
@@ -192,9 +196,151 @@ function testRecommendationAlgorithm() {
   console.log('');
 }
 
+/**
+ * The curation algorithm before the single-pass rewrite: per-track
+ * includes/indexOf over every list and a find/includes fill loop. Kept as
+ * the reference the benchmark checks results against.
+ */
+function legacyCuratedRecommendations(artistRecommendations, targetCount = 5) {
+  const trackFrequency = new Map();
+  artistRecommendations.forEach((recs, artistIndex) => {
+    recs.forEach(trackId => {
+      if (!trackFrequency.has(trackId)) {
+        trackFrequency.set(trackId, { count: 0, artists: [], weightedScore: 0 });
+      }
+      const trackData = trackFrequency.get(trackId);
+      trackData.count++;
+      trackData.artists.push(artistIndex);
+    });
+  });
+
+  for (const [trackId, trackData] of trackFrequency) {
+    trackData.weightedScore = calculateWeightedScore(trackId, artistRecommendations);
+  }
+
+  const sortedTracks = Array.from(trackFrequency.entries())
+    .map(([trackId, data]) => ({ trackId, ...data, finalScore: data.weightedScore + (data.count * 0.5) }))
+    .sort((a, b) => b.finalScore - a.finalScore);
+
+  const finalRecommendations = [];
+  const artistCounts = new Array(artistRecommendations.length).fill(0);
+  const maxPerArtist = Math.ceil(targetCount / artistRecommendations.length) + 1;
+  for (const track of sortedTracks) {
+    if (finalRecommendations.length >= targetCount) break;
+    if (track.artists.every(artistIndex => artistCounts[artistIndex] < maxPerArtist)) {
+      finalRecommendations.push(track.trackId);
+      track.artists.forEach(artistIndex => {
+        artistCounts[artistIndex]++;
+      });
+    }
+  }
+  while (finalRecommendations.length < targetCount && finalRecommendations.length < sortedTracks.length) {
+    const nextTrack = sortedTracks.find(track => !finalRecommendations.includes(track.trackId));
+    if (!nextTrack) break;
+    finalRecommendations.push(nextTrack.trackId);
+  }
+  return finalRecommendations;
+}
+
+/**
+ * Deterministic candidate lists: `artists` lists of `candidates` track ids
+ * drawn from a shared catalogue with a popularity skew, so lists overlap
+ * the way real per-artist recommendations do.
+ */
+function makeArtistRecommendations(artists, candidates, seed = 1) {
+  let state = seed >>> 0;
+  const random = () => {
+    state = (Math.imul(state, 1664525) + 1013904223) >>> 0;
+    return state / 2 ** 32;
+  };
+  const catalogueSize = artists * candidates;
+  return Array.from({ length: artists }, () => {
+    const recs = new Set();
+    while (recs.size < candidates) {
+      recs.add(`track_${Math.floor(catalogueSize * random() ** 3)}`);
+    }
+    return [...recs];
+  });
+}
+
+async function timePerCall(fn, minMs = 200) {
+  let calls = 0;
+  const start = process.hrtime.bigint();
+  let elapsed = 0;
+  while (elapsed < minMs || calls < 3) {
+    await fn();
+    calls++;
+    elapsed = Number(process.hrtime.bigint() - start) / 1e6;
+  }
+  return elapsed / calls;
+}
+
+/**
+ * Check the curation algorithm against the legacy reference and time both
+ * at growing sizes up to `artists` x `candidates`.
+ */
+async function benchmarkCuration(artists = 50, candidates = 500, targetCount = 20) {
+  console.log(`⏱️ Benchmarking curation up to ${artists} artists x ${candidates} candidates (targetCount ${targetCount})\n`);
+
+  // the curation engine logs every call; keep the benchmark output readable
+  const log = console.log;
+  const quiet = async (fn) => {
+    console.log = () => {};
+    try {
+      return await fn();
+    } finally {
+      console.log = log;
+    }
+  };
+
+  let checked = 0;
+  for (let seed = 1; seed <= 20; seed++) {
+    const recs = makeArtistRecommendations(1 + (seed % 8), 5 + seed * 3, seed);
+    for (const count of [1, 5, 20, 200]) {
+      const expected = legacyCuratedRecommendations(recs, count);
+      const actual = await quiet(() => getProductionCuratedRecommendations(recs, count));
+      if (JSON.stringify(actual) !== JSON.stringify(expected)) {
+        throw new Error(`Curation differs from the reference (seed ${seed}, targetCount ${count})`);
+      }
+      checked++;
+    }
+  }
+  console.log(`✅ Matches the reference on ${checked} generated cases\n`);
+
+  const sizes = [0.2, 0.5, 1].map(f => [Math.max(1, Math.round(artists * f)), Math.max(1, Math.round(candidates * f))]);
+  const rows = [];
+  for (const [a, c] of sizes) {
+    const recs = makeArtistRecommendations(a, c, a * c);
+    const expected = legacyCuratedRecommendations(recs, targetCount);
+    const actual = await quiet(() => getProductionCuratedRecommendations(recs, targetCount));
+    if (JSON.stringify(actual) !== JSON.stringify(expected)) {
+      throw new Error(`Curation differs from the reference at ${a} x ${c}`);
+    }
+    const legacyMs = await timePerCall(() => legacyCuratedRecommendations(recs, targetCount));
+    const currentMs = await quiet(() => timePerCall(() => getProductionCuratedRecommendations(recs, targetCount)));
+    rows.push({
+      size: `${a} x ${c}`,
+      entries: a * c,
+      legacyMs: Number(legacyMs.toFixed(3)),
+      currentMs: Number(currentMs.toFixed(3)),
+      speedup: `${(legacyMs / currentMs).toFixed(1)}x`,
+    });
+  }
+  console.table(rows);
+  return rows;
+}
+
 // Run the test
 if (require.main === module) {
-  testRecommendationAlgorithm();
+  if (process.argv[2] === '--bench') {
+    const [artists, candidates, targetCount] = process.argv.slice(3).map(Number);
+    benchmarkCuration(artists || undefined, candidates || undefined, targetCount || undefined).catch(err => {
+      console.error('❌', err.message);
+      process.exit(1);
+    });
+  } else {
+    testRecommendationAlgorithm();
+  }
 }
 
-module.exports = { testRecommendationAlgorithm };
+module.exports = { testRecommendationAlgorithm, benchmarkCuration, legacyCuratedRecommendations };
@@ -0,0 +1,86 @@
+const assert = require('assert');
+const { startMockSpotify } = require('./mockSpotifyServer');
+
+/**
+ * Drive the shared Spotify client against a rate-limited mock Spotify API:
+ * a burst of users should queue and complete instead of failing with 429s,
+ * identical in-flight calls should coalesce, a full queue should fail fast
+ * and token exchanges should not wait behind it.
+ *
+ * Usage: node utils/testSpotifyClient.js
+ */
+async function testSpotifyClient() {
+  console.log('🧪 Testing the Spotify client against a rate-limited mock\n');
+
+  // the client's pace is set a little above the mock's limit so some 429s happen
+  const mock = await startMockSpotify({ ratePerSec: 20, retryAfterSec: 1, latencyMs: 20 });
+  process.env.SPOTIFY_API_BASE = mock.url;
+  process.env.SPOTIFY_ACCOUNTS_BASE = mock.accountsUrl;
+  process.env.SPOTIFY_RATE_PER_SEC = '25';
+  process.env.SPOTIFY_BURST = '25';
+  process.env.SPOTIFY_MAX_QUEUE = '100';
+  const spotifyClient = require('./spotifyClient');
+
+  const topArtists = token => spotifyClient.get('/me/top/artists', {
+    params: { limit: 10 },
+    headers: { Authorization: `Bearer ${token}` },
+  });
+
+  try {
+    let start = Date.now();
+    const results = await Promise.allSettled(Array.from({ length: 60 }, (_, i) => topArtists(`user_${i}`)));
+    const failed = results.filter(result => result.status === 'rejected');
+    assert.strictEqual(failed.length, 0, `${failed.length} of 60 calls failed: ${failed[0]?.reason?.message}`);
+    console.log(`✅ 60 users in a burst all got their artists in ${Date.now() - start}ms`);
+    console.log(`   mock answered ${mock.stats.rateLimited} with 429; client queued ${spotifyClient.stats().queued}, retried ${spotifyClient.stats().retries}`);
+
+    const before = { ok: mock.stats.ok, coalesced: spotifyClient.stats().coalesced };
+    await Promise.all(Array.from({ length: 30 }, () => topArtists('same_user')));
+    assert.strictEqual(mock.stats.ok - before.ok, 1);
+    assert.strictEqual(spotifyClient.stats().coalesced - before.coalesced, 29);
+    console.log('✅ 30 identical concurrent calls were sent to Spotify once');
+
+    const okBefore = mock.stats.ok;
+    const accept304 = status => status === 200 || status === 304;
+    await Promise.all([
+      topArtists('other_user'),
+      spotifyClient.request('get', '/me/top/artists', {
+        params: { limit: 10 }, headers: { Authorization: 'Bearer other_user' }, validateStatus: accept304,
+      }),
+    ]);
+    assert.strictEqual(mock.stats.ok - okBefore, 2);
+    console.log('✅ Calls with a different validateStatus are not coalesced');
+
+    start = Date.now();
+    const floodDone = Promise.allSettled(Array.from({ length: 300 }, (_, i) => topArtists(`flood_${i}`)));
+    const token = await spotifyClient.request('post', spotifyClient.accountsUrl('/api/token'), {
+      data: new URLSearchParams({ grant_type: 'authorization_code', code: 'mock' }),
+      headers: { 'Content-Type': 'application/x-www-form-urlencoded' },
+    });
+    const stillQueued = spotifyClient.stats().queueLength;
+    assert.ok(token.data.access_token);
+    assert.ok(stillQueued > 0, 'the token exchange should not wait for the Web API queue');
+    console.log(`✅ Token exchange during the flood took ${Date.now() - start}ms with ${stillQueued} Web API calls still queued`);
+
+    const flood = await floodDone;
+    const queueFull = flood.filter(result => result.status === 'rejected' && result.reason.code === 'SPOTIFY_QUEUE_FULL');
+    const other = flood.filter(result => result.status === 'rejected' && result.reason.code !== 'SPOTIFY_QUEUE_FULL');
+    assert.strictEqual(other.length, 0, `unexpected failure: ${other[0]?.reason?.message}`);
+    assert.ok(queueFull.length > 0, 'a flood beyond the queue should be turned away');
+    console.log(`✅ Flood of 300: ${300 - queueFull.length} served, ${queueFull.length} turned away at once (retry after ${queueFull[0].reason.retryAfterMs.toFixed(0)}ms), ${Date.now() - start}ms`);
+
+    console.log('\n📊 Client:', spotifyClient.stats());
+    console.log('📊 Mock Spotify:', mock.stats);
+  } finally {
+    await mock.close();
+  }
+}
+
+if (require.main === module) {
+  testSpotifyClient().catch(err => {
+    console.error('❌', err.message);
+    process.exit(1);
+  });
+}
+
+module.exports = { testSpotifyClient };
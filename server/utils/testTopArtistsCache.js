@@ -0,0 +1,60 @@
+const assert = require('assert');
+const { startMockSpotify, SAMPLE_ARTISTS } = require('./mockSpotifyServer');
+
+/**
+ * Exercise the per-session top-artists cache against the local mock Spotify
+ * API: fresh hits, If-None-Match revalidation, changed data and re-login.
+ *
+ * Usage: node utils/testTopArtistsCache.js
+ */
+async function testTopArtistsCache() {
+  console.log('🧪 Testing top artists cache against the mock Spotify API\n');
+
+  const mock = await startMockSpotify();
+  process.env.SPOTIFY_API_BASE = mock.url;
+  process.env.TOP_ARTISTS_TTL_MS = '200';
+  const topArtistsCache = require('./topArtistsCache');
+  const sleep = ms => new Promise(resolve => setTimeout(resolve, ms));
+
+  try {
+    const first = await topArtistsCache.getTopArtists('session_a', 'token_a');
+    assert.deepStrictEqual(first.artistNames, SAMPLE_ARTISTS.map(artist => artist.name));
+    assert.ok(first.artistImageURLs[3].startsWith('data:image/png;base64,'), 'placeholder for artists without images');
+    assert.strictEqual(first.artists[0].images, undefined, 'artists are trimmed');
+    console.log('✅ First load fetched and trimmed', first.artistNames.length, 'artists');
+
+    await Promise.all(Array.from({ length: 20 }, () => topArtistsCache.getTopArtists('session_a', 'token_a')));
+    assert.strictEqual(mock.stats.requests, 1);
+    console.log('✅ 20 reloads within the TTL made no Spotify requests');
+
+    await sleep(250);
+    await Promise.all(Array.from({ length: 5 }, () => topArtistsCache.getTopArtists('session_a', 'token_a')));
+    assert.strictEqual(mock.stats.requests, 2);
+    assert.strictEqual(mock.stats.notModified, 1);
+    console.log('✅ After the TTL, concurrent reloads shared one If-None-Match request answered 304');
+
+    mock.setArtists([...SAMPLE_ARTISTS].reverse());
+    await sleep(250);
+    const changed = await topArtistsCache.getTopArtists('session_a', 'token_a');
+    assert.strictEqual(changed.artistNames[0], SAMPLE_ARTISTS[SAMPLE_ARTISTS.length - 1].name);
+    console.log('✅ A changed list was picked up on revalidation');
+
+    await topArtistsCache.getTopArtists('session_a', 'token_b');
+    assert.strictEqual(mock.stats.requests, 4);
+    console.log('✅ A new access token for the session revalidated at once');
+
+    console.log('\n📊 Cache:', topArtistsCache.stats());
+    console.log('📊 Mock Spotify:', mock.stats);
+  } finally {
+    await mock.close();
+  }
+}
+
+if (require.main === module) {
+  testTopArtistsCache().catch(err => {
+    console.error('❌', err.message);
+    process.exit(1);
+  });
+}
+
+module.exports = { testTopArtistsCache };
@@ -0,0 +1,143 @@
+const spotifyClient = require('./spotifyClient');
+
+const TOP_ARTISTS_TTL_MS = Number(process.env.TOP_ARTISTS_TTL_MS) || 10 * 60 * 1000;
+const TOP_ARTISTS_CACHE_MAX_ENTRIES = Number(process.env.TOP_ARTISTS_CACHE_MAX_ENTRIES) || 1000;
+const TOP_ARTISTS_LIMIT = 10;
+
+// Shown for artists without a Spotify image
+const PLACEHOLDER_IMAGE = `data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAALcAAAETCAMAAABDSmf
+hAAAAMFBMVEXd3d3////a2trf39/6+vrl5eXv7+/4+Pjn5+fy8vLe3t7m5ubi4uLs7Oz5+f
+n09PQCwX1aAAAFbUlEQVR4nO2c2ZKrMBBDEzNZJ0z+/29vnI0lQAxIcrtunweeVS65F2P3Z
+uM4juM4juM4juM4juM4juM4juM4juM4juM4juM4aYTcAuYRQrjs6rreX/e376UKJegP1fH0
+s+3yt9/Z1h6qfV/zi8PRrm3qMdEPrjuDysNmPyn6zk9tTnmC6jt1bqFtQp2oOnK0subhMu3
+rD7dcTCgPp1mqI9fcmuNiz1Yd+c285LOc3VnyrMLDdaHsm8urfLLP8zZkj2xeOa9RfWOfR/
+iyHdkmi8nXy76ZvEzZGYSv9XYm4SjZYuFhVQDMJjwccLJvwlVRJaQW24mowuEOK1uVgCq07
+FsvIZAd/vC6t/wia3HlOgl/bxJcEmHvTYpLImSLU1xy50zVTZO9PRCdsqIv+w7RKaRN+YQm
+G1uXfHBiOQXTK4xDyj7k5aZtTfZyb7c7hmz6cpPSPTeYPCAsODV2v2AsuEA2Y8F5lUkbeEh
+BtvBToGM4Pwg+2GNlL/gbshCsUYJKNnhnws8eRoF2bDqbYMtZnU2w/YMqmkSQRtEknSc43Y
+JSsAUuoijtjbwzobQ3skaR2htncEnp3eKC0s06FBwBZnCtbNhBinZb4ro18baEbUy5bkzTo
+w4nqICizfIRTEmoaokbMIFQW51EMM2xXjcmgOt1Yyorddr533UfXbdU92+hun29tbpLjSe4
+y4KplJovS61PSq0HQbrlfUOp/Q7opxr4Xul3Cu3nUecn6oSJOq9SJx7U+aC6oUf9cFAHFNg
+VSG1AwV1C0f0tjgDv40l14368an84wGRrDY68Y6U0OPLmjLKURf1Nu+sW3uOAXvjRGQV7K1
+lnFKRNNsKIAr5AqLgdGwHfw5PVVvC765rmAX91XVOE/6Jla45lGfeoFQtOGesicDjlYQY/p
+JCm6NBjOOnhEbu6or1Q41YpxEev1LIQXFG1YTqF+QCTGcS5b7ppP9fIM9A479AFL9FJFidu
+ypdwhsUVIyIIaVMzSwS/N7mP518EdCmumMdxF47t7nUDuKBXT6mJsi8cd7IsHgVVqGxUNNS
+POoPUtLTZCuMgomGWGYTro2GmmY9rG3zKWIUkVoXxDN5+ss4p2ebfrizFD3WVRfm6caZ3/v
+TTklFFoVZ5qGCHhdI5z9BCVjXOHN43SCrZufO+k6BnznDmvFYj507Wsc9NOHM+G8MifOHoQ
+aZ94STZFfu2Eke44A89Q7jkdQZceBDd7QULh2dIjXCdbGg4VMpGFrbiB1Oo8lD+zgtzPqt/
+5oURrpeNEK5/vHNn7eYkl1I04fq3ri9WJSDVbcchVvyJ1U+0aLNctnzwSYfFP2P1D6K7LJ0
+wl1n2woyfKXJ3WLI384XAFvNlZyhLBpht8cyx5M3cKwe5Y8mbeSeH+rfnY/zNcUq2cmqAOc
+EwZ13yQbpTLITuhvRTfe070a+kxpS8ZeAAibpNZMo2ae2mnRj4Jmlrysckficl3Rtc7qTC0
+OByp8RCk8ud0N6bXO7vzabR5f664OZi94vputBcqmyYXHAz7cInUyHFViHYYyKGm6q7+4wn
+TeVYggWMr3duZdOMvlE3mnPejBjFcBB8MPLaWz/YcSbDodD4rowMvvMxW5o0DD6cNtbFDzF
+UFVo5yZxkIGcWYJPBEG62gu3wYZQibDJklNyK0vgwShk2+YgohdjkwyhFRJNIL/UYbtC69G
+oUQz9GvtC1ifUStqHT15tuLLucCoyCkXYkLCYKRsq0d+c3VUH27qR66418hyaCF9BZtglF2
+rtdouRWMo93iVJAR9zm/TC5qG3ZZJ6isk4kFLktm42ZW8dcniWh+fPMPnVxxeCDZ0ApLJy8
+/mWa/ok2yCMQFtPKN5z/AZpDb7mUEOhpAAAAAElFTkSuQmCC`;
+
+/**
+ * Per-session cache of the user's Spotify top artists.
+ *
+ * The trimmed /top_artists payload is built once per Spotify response and
+ * served from memory for TOP_ARTISTS_TTL_MS. After that the entry is
+ * revalidated with If-None-Match, so an unchanged list costs Spotify a 304
+ * and us nothing to rebuild. Concurrent loads for the same session share one
+ * request. Entries are keyed by session id and remember the access token they
+ * were fetched with; a session that logs in again revalidates at once.
+ */
+const entries = new Map(); // sessionId -> { accessToken, etag, payload, fetchedAt }; Map order is recency order
+const inFlight = new Map(); // sessionId -> Promise<payload>
+const counters = { hits: 0, revalidated: 0, fetched: 0, staleServed: 0 };
+
+function toPayload(items) {
+  return {
+    artists: items.map(artist => ({
+      id: artist.id,
+      name: artist.name,
+      genres: artist.genres,
+      popularity: artist.popularity,
+    })),
+    artistNames: items.map(artist => artist.name),
+    artistIds: items.map(artist => artist.id),
+    artistImageURLs: items.map(artist => artist.images?.[0]?.url || PLACEHOLDER_IMAGE),
+  };
+}
+
+function remember(sessionId, entry) {
+  entries.delete(sessionId);
+  entries.set(sessionId, entry);
+  if (entries.size > TOP_ARTISTS_CACHE_MAX_ENTRIES) {
+    entries.delete(entries.keys().next().value);
+  }
+  return entry.payload;
+}
+
+// rate limiting, Spotify outages and network errors can fall back to what we have
+function canServeStale(err) {
+  const status = err.response?.status;
+  return !status || status === 429 || status >= 500;
+}
+
+async function load(sessionId, accessToken, cached) {
+  const headers = { Authorization: `Bearer ${accessToken}` };
+  if (cached?.etag) headers['If-None-Match'] = cached.etag;
+
+  let response;
+  try {
+    response = await spotifyClient.request('get', '/me/top/artists', {
+      params: { limit: TOP_ARTISTS_LIMIT },
+      headers,
+      validateStatus: status => (status >= 200 && status < 300) || status === 304,
+    });
+  } catch (err) {
+    if (cached && cached.accessToken === accessToken && canServeStale(err)) {
+      counters.staleServed++;
+      console.warn(`⚠️ Serving cached top artists after Spotify error: ${err.message}`);
+      return cached.payload;
+    }
+    throw err;
+  }
+
+  if (response.status === 304 && cached) {
+    counters.revalidated++;
+    return remember(sessionId, { ...cached, accessToken, fetchedAt: Date.now() });
+  }
+
+  counters.fetched++;
+  const payload = toPayload(response.data.items || []);
+  console.log(`📊 Retrieved ${payload.artistNames.length} top artists:`, payload.artistNames);
+  return remember(sessionId, { accessToken, etag: response.headers.etag || null, payload, fetchedAt: Date.now() });
+}
+
+/**
+ * The /top_artists payload for this session:
+ * { artists, artistNames, artistIds, artistImageURLs }.
+ * Spotify errors propagate (see spotifyClient.request) unless a cached copy
+ * can be served.
+ */
+async function getTopArtists(sessionId, accessToken) {
+  const cached = entries.get(sessionId);
+  if (cached && cached.accessToken === accessToken && Date.now() - cached.fetchedAt < TOP_ARTISTS_TTL_MS) {
+    counters.hits++;
+    return remember(sessionId, cached);
+  }
+
+  if (!inFlight.has(sessionId)) {
+    inFlight.set(sessionId, load(sessionId, accessToken, cached).finally(() => inFlight.delete(sessionId)));
+  }
+  return inFlight.get(sessionId);
+}
+
+function evict(sessionId) {
+  entries.delete(sessionId);
+}
+
+function stats() {
+  return { ...counters, entries: entries.size, maxEntries: TOP_ARTISTS_CACHE_MAX_ENTRIES, ttlMs: TOP_ARTISTS_TTL_MS };
+}
+
+module.exports = {
+  getTopArtists,
+  evict,
+  stats,
+};
@@ -0,0 +1,121 @@
+const fs = require('fs');
+const readline = require('readline');
+
+/**
+ * Per-stage latency percentiles from the NDJSON trace logs written with
+ * TRACE_LOG_FILE by the Node server (utils/tracing.js) and the ML service
+ * (api/main.py).
+ *
+ * ML lines are joined to the server request with the same requestId, so each
+ * server route gets its own stages (spotify, mongo, ml, ...) plus the ML
+ * service's internal ones (ml:score, ml:topk, ...) and ml-network: the part
+ * of "ml" the service itself did not account for (network hop, queueing,
+ * serialisation).
+ *
+ * Usage: node utils/traceReport.js <trace.ndjson> [more.ndjson ...] [--path /api/recommend]
+ */
+function percentile(sorted, p) {
+  if (sorted.length === 0) return null;
+  return sorted[Math.min(sorted.length - 1, Math.ceil((p / 100) * sorted.length) - 1)];
+}
+
+async function readTraces(files) {
+  const traces = [];
+  for (const file of files) {
+    const lines = readline.createInterface({ input: fs.createReadStream(file), crlfDelay: Infinity });
+    for await (const line of lines) {
+      if (!line.trim()) continue;
+      try {
+        traces.push(JSON.parse(line));
+      } catch (err) {
+        // partial last line of a log still being written
+      }
+    }
+  }
+  return traces;
+}
+
+/**
+ * Map "service path" -> Map stage -> [ms per request].
+ */
+function stageSamples(traces) {
+  const mlByRequest = new Map();
+  for (const trace of traces) {
+    if (trace.service !== 'ml') continue;
+    if (!mlByRequest.has(trace.requestId)) mlByRequest.set(trace.requestId, []);
+    mlByRequest.get(trace.requestId).push(trace);
+  }
+  const serverIds = new Set(traces.filter(trace => trace.service === 'server').map(trace => trace.requestId));
+
+  const groups = new Map();
+  const add = (group, stage, ms) => {
+    if (!groups.has(group)) groups.set(group, new Map());
+    const stages = groups.get(group);
+    if (!stages.has(stage)) stages.set(stage, []);
+    stages.get(stage).push(ms);
+  };
+
+  for (const trace of traces) {
+    const group = `${trace.service} ${trace.method} ${trace.path}`;
+    if (trace.service === 'ml' && serverIds.has(trace.requestId)) {
+      // reported under the server route that made the call (below), not on its own
+      continue;
+    }
+    add(group, 'total', trace.durationMs);
+    const spans = { ...trace.spans };
+
+    if (trace.service === 'server') {
+      const calls = mlByRequest.get(trace.requestId) || [];
+      // ML stages summed over the request's calls (a fan-out makes several)
+      const mlStages = {};
+      for (const call of calls) {
+        for (const [stage, ms] of Object.entries(call.spans)) {
+          mlStages[`ml:${stage}`] = (mlStages[`ml:${stage}`] || 0) + ms;
+        }
+      }
+      Object.assign(spans, mlStages);
+      if (spans.ml !== undefined && spans['ml-app'] !== undefined) {
+        spans['ml-network'] = Math.max(0, spans.ml - spans['ml-app']);
+      }
+    }
+    for (const [stage, ms] of Object.entries(spans)) add(group, stage, ms);
+  }
+  return groups;
+}
+
+function report(groups, pathFilter) {
+  for (const [group, stages] of [...groups].sort()) {
+    if (pathFilter && !group.endsWith(` ${pathFilter}`)) continue;
+    const requests = stages.get('total').length;
+    console.log(`\n${group} (${requests} requests)`);
+    const rows = {};
+    for (const [stage, samples] of stages) {
+      const sorted = [...samples].sort((a, b) => a - b);
+      rows[stage] = {
+        seen: samples.length,
+        p50: Number(percentile(sorted, 50).toFixed(2)),
+        p95: Number(percentile(sorted, 95).toFixed(2)),
+        p99: Number(percentile(sorted, 99).toFixed(2)),
+      };
+    }
+    console.table(rows);
+  }
+}
+
+if (require.main === module) {
+  const args = process.argv.slice(2);
+  const pathIndex = args.indexOf('--path');
+  const pathFilter = pathIndex >= 0 ? args.splice(pathIndex, 2)[1] : null;
+  if (args.length === 0) {
+    console.error('Usage: node utils/traceReport.js <trace.ndjson> [more.ndjson ...] [--path /api/recommend]');
+    process.exit(1);
+  }
+  readTraces(args)
+    .then(traces => report(stageSamples(traces), pathFilter))
+    .catch(err => {
+      console.error('❌ Failed to read traces:', err.message);
+      process.exit(1);
+    });
+}
+
+module.exports = { readTraces, stageSamples, percentile };
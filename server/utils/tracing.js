@@ -0,0 +1,139 @@
+const { AsyncLocalStorage } = require('async_hooks');
+const { performance } = require('perf_hooks');
+const crypto = require('crypto');
+const fs = require('fs');
+
+const TRACE_LOG_FILE = process.env.TRACE_LOG_FILE;
+
+/**
+ * Per-request latency tracing.
+ *
+ * The middleware gives every request an id (the caller's X-Request-Id or a
+ * new one) that mlClient forwards to the ML service, and collects the time
+ * spent per stage (spotify, mongo, ml, ml-app) while the request runs. The
+ * stages go back in a Server-Timing header and, when TRACE_LOG_FILE is set,
+ * as one NDJSON line per request:
+ *
+ *   {"ts","service":"server","requestId","method","path","status","durationMs","spans":{"ml":12.3,...}}
+ *
+ * api/main.py writes the same format with service "ml"; utils/traceReport.js
+ * joins both into per-stage percentiles.
+ *
+ * A stage's duration is the wall time covered by its intervals, so calls
+ * made in parallel (the ML fan-out) count once rather than being summed.
+ */
+const storage = new AsyncLocalStorage();
+const traceLog = TRACE_LOG_FILE ? fs.createWriteStream(TRACE_LOG_FILE, { flags: 'a' }) : null;
+
+function currentTrace() {
+  return storage.getStore();
+}
+
+function requestId() {
+  return currentTrace()?.requestId;
+}
+
+/**
+ * Record that stage `name` ran from `start` to `end` (performance.now() ms)
+ * in the current request; a no-op outside one.
+ */
+function record(name, start, end = performance.now()) {
+  const trace = currentTrace();
+  if (!trace) return;
+  if (!trace.intervals.has(name)) trace.intervals.set(name, []);
+  trace.intervals.get(name).push([start, end]);
+}
+
+/**
+ * Await fn() and record its duration as stage `name`.
+ */
+async function span(name, fn) {
+  const start = performance.now();
+  try {
+    return await fn();
+  } finally {
+    record(name, start);
+  }
+}
+
+function coveredMs(intervals) {
+  const sorted = [...intervals].sort((a, b) => a[0] - b[0]);
+  let total = 0;
+  let [from, to] = sorted[0];
+  for (const [start, end] of sorted.slice(1)) {
+    if (start > to) {
+      total += to - from;
+      [from, to] = [start, end];
+    } else {
+      to = Math.max(to, end);
+    }
+  }
+  return total + (to - from);
+}
+
+function stageDurations(trace) {
+  const stages = {};
+  for (const [name, intervals] of trace.intervals) {
+    stages[name] = Number(coveredMs(intervals).toFixed(3));
+  }
+  return stages;
+}
+
+/**
+ * Server-Timing header value, e.g. "ml;dur=12.30, mongo;dur=1.10, total;dur=15.02".
+ */
+function serverTiming(trace, totalMs) {
+  return Object.entries(stageDurations(trace))
+    .map(([name, ms]) => `${name};dur=${ms.toFixed(2)}`)
+    .concat(`total;dur=${totalMs.toFixed(2)}`)
+    .join(', ');
+}
+
+/**
+ * Run fn outside the current request's trace, for background work started by
+ * a request that must not carry its id or add to its stages.
+ */
+function detached(fn) {
+  return storage.exit(fn);
+}
+
+function middleware(req, res, next) {
+  const trace = {
+    requestId: req.get('x-request-id') || crypto.randomUUID(),
+    start: performance.now(),
+    intervals: new Map(),
+  };
+  res.setHeader('X-Request-Id', trace.requestId);
+
+  // Server-Timing has to be set before the headers go out
+  const writeHead = res.writeHead;
+  res.writeHead = function (...args) {
+    if (!res.headersSent) res.setHeader('Server-Timing', serverTiming(trace, performance.now() - trace.start));
+    return writeHead.apply(this, args);
+  };
+
+  if (traceLog) {
+    res.on('finish', () => {
+      traceLog.write(JSON.stringify({
+        ts: new Date().toISOString(),
+        service: 'server',
+        requestId: trace.requestId,
+        method: req.method,
+        path: req.route ? `${req.baseUrl}${req.route.path}` : req.originalUrl.split('?')[0],
+        status: res.statusCode,
+        durationMs: Number((performance.now() - trace.start).toFixed(3)),
+        spans: stageDurations(trace),
+      }) + '\n');
+    });
+  }
+
+  storage.run(trace, next);
+}
+
+module.exports = {
+  middleware,
+  span,
+  record,
+  requestId,
+  detached,
+};